@@ -0,0 +1,81 @@
+'''
+歌词查找性能对比：逐行扫描（旧实现） vs 游标 + 二分查找
+
+    python benchmarks/lyrics_lookup.py [行数...]
+
+模拟每秒一次的歌词刷新，包含顺序播放和随机跳转两种情况
+'''
+import os
+import sys
+import random
+import timeit
+import importlib.util
+
+# 直接加载解析模块，不需要安装 Home Assistant
+PARSER_PATH = os.path.join(os.path.dirname(__file__), '..', 'custom_components', 'ha_cloud_music', 'lyrics', 'parser.py')
+spec = importlib.util.spec_from_file_location('lyrics_parser', PARSER_PATH)
+parser = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(parser)
+
+DEFAULT_LINES = [50, 500, 2000]
+REPEAT = 5
+
+class LinearLyricParser:
+    ''' 旧实现：每次从第一行开始扫描 '''
+
+    def __init__(self, lines):
+        self.lyrics = sorted(lines, key=lambda x: x.time)
+        self.current_index = 0
+
+    def get_current_lyric(self, current_time):
+        if not self.lyrics:
+            return None
+        for i, line in enumerate(self.lyrics):
+            if i == len(self.lyrics) - 1 or (line.time <= current_time < self.lyrics[i + 1].time):
+                self.current_index = i
+                return line.text
+        return None
+
+def make_lrc(count, interval=4):
+    rows = []
+    for i in range(count):
+        seconds = i * interval
+        rows.append(f'[{seconds // 60:02d}:{seconds % 60:02d}.00]第{i}句歌词')
+    return '\n'.join(rows), count * interval
+
+def run(count):
+    lrc, duration = make_lrc(count)
+    timeline = parser.parse_lrc(lrc)
+    lines = [parser.LyricLine(time, text) for time, text in zip(timeline.times, timeline.texts)]
+    # 顺序播放：每秒刷新一次
+    sequential = list(range(duration))
+    # 随机跳转：每次刷新位置都不同
+    seek = [random.uniform(0, duration) for _ in range(duration)]
+
+    results = []
+    for name, positions in (('顺序播放', sequential), ('随机跳转', seek)):
+        linear = LinearLyricParser(lines)
+        cursor = parser.LyricParser()
+        cursor.load(timeline)
+        # 两种实现结果一致（第一句之前除外）
+        for position in positions:
+            expected = linear.get_current_lyric(position)
+            actual = cursor.get_current_lyric(position)
+            if position >= lines[0].time and expected != actual:
+                raise AssertionError(f'{position}: {expected} != {actual}')
+
+        linear_time = min(timeit.repeat(lambda: [linear.get_current_lyric(p) for p in positions], number=1, repeat=REPEAT))
+        cursor_time = min(timeit.repeat(lambda: [cursor.get_current_lyric(p) for p in positions], number=1, repeat=REPEAT))
+        results.append((name, len(positions), linear_time, cursor_time))
+    return results
+
+def main(argv):
+    counts = [int(arg) for arg in argv] or DEFAULT_LINES
+    print(f'{"行数":>6} {"场景":<6} {"查找次数":>8} {"逐行扫描(us/次)":>16} {"游标(us/次)":>12} {"倍数":>8}')
+    for count in counts:
+        for name, lookups, linear_time, cursor_time in run(count):
+            print(f'{count:>6} {name:<6} {lookups:>8} {linear_time / lookups * 1e6:>16.2f} '
+                f'{cursor_time / lookups * 1e6:>12.2f} {linear_time / cursor_time:>8.1f}')
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
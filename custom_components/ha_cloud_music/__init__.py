@@ -6,13 +6,15 @@ from homeassistant.config_entries import ConfigEntry
 from homeassistant.helpers.typing import ConfigType
 from homeassistant.components.frontend import add_extra_js_url
 import homeassistant.helpers.config_validation as cv
-from homeassistant.const import CONF_URL
+from homeassistant.const import CONF_URL, EVENT_HOMEASSISTANT_STOP
 
 import asyncio
-from .const import PLATFORMS
+from .const import PLATFORMS, DISK_CACHE_SIZE
 from .manifest import manifest
-from .http import HttpView
+from .http import HttpView, LyricsView
 from .cloud_music import CloudMusic
+from .http_api import async_close_session
+from . import websocket_api
 
 DOMAIN = "ha_cloud_music"
 _LOGGER = logging.getLogger(__name__)
@@ -34,6 +36,9 @@ async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
         frontend_path,
         cache_headers=False
     )
+
+    # 歌词卡片的订阅接口
+    websocket_api.async_setup(hass)
     
     return True
 
@@ -43,11 +48,19 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
         # 设置云音乐服务
         data = entry.data
         api_url = data.get(CONF_URL)
-        hass.data['cloud_music'] = CloudMusic(hass, api_url)
+        cache_size = entry.options.get('cache_size', DISK_CACHE_SIZE)
+        hass.data['cloud_music'] = CloudMusic(hass, api_url, int(cache_size))
 
         hass.http.register_view(HttpView)
+        hass.http.register_view(LyricsView)
         await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
         entry.async_on_unload(entry.add_update_listener(update_listener))
+
+        # HA停止时保存播放器特性，关闭共享连接池
+        async def async_stop(event):
+            await hass.data['cloud_music'].async_flush_renderers()
+            await async_close_session()
+        entry.async_on_unload(hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, async_stop))
         
         return True
     except Exception as e:
@@ -61,4 +74,10 @@ async def update_listener(hass, entry):
 
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
-    return await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
\ No newline at end of file
+    unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
+    if unload_ok:
+        cloud_music = hass.data.get('cloud_music')
+        if cloud_music is not None:
+            await cloud_music.async_close()
+        await async_close_session()
+    return unload_ok
@@ -680,8 +680,7 @@ async def async_browse_media(media_player, media_content_type, media_content_id)
             children=[],
         )
 
-        result = await http_get('https://rapi.qingting.fm/categories?type=channel')
-        data = result['Data']
+        data = await cloud_music.async_fm_categories()
         for item in data:
             title = item['title']
             library_info.children.append(
@@ -757,8 +756,15 @@ async def async_play_media(media_player, cloud_music, media_content_id):
         media_player.playindex = playindex
         return 'index'
 
+    pages = None
     if media_content_id.startswith(CloudMusicRouter.playlist):
-        playlist = await cloud_music.async_get_playlist(id)
+        # 分页加载，加载到要播放的歌曲后即开始播放
+        pages = cloud_music.async_iter_playlist(id)
+        playlist = []
+        async for items in pages:
+            playlist.extend(items)
+            if len(playlist) > playindex:
+                break
     elif media_content_id.startswith(CloudMusicRouter.my_daily):
         playlist = await cloud_music.async_get_dailySongs()
     elif media_content_id.startswith(CloudMusicRouter.my_ilike):
@@ -799,10 +805,48 @@ async def async_play_media(media_player, cloud_music, media_content_id):
         playlist = await cloud_music.async_play_xmly(keywords)
 
     if playlist is not None:
+        # 停止加载上一个歌单
+        playlist_task = getattr(media_player, 'playlist_task', None)
+        if playlist_task is not None:
+            playlist_task.cancel()
+            media_player.playlist_task = None
         media_player.playindex = playindex
         media_player.playlist = playlist
+        # 后台加载剩余的歌曲
+        if pages is not None:
+            media_player.playlist_task = hass.async_create_background_task(
+                async_load_playlist_pages(media_player, playlist, pages),
+                f'{media_player.entity_id} playlist pages'
+            )
         return 'playlist'
 
+# 后台加载歌单剩余分页，播放列表被替换后停止
+async def async_load_playlist_pages(media_player, playlist, pages):
+    try:
+        async for items in pages:
+            if media_player.playlist is not playlist:
+                break
+            playlist.extend(items)
+    except Exception as ex:
+        _LOGGER.warning('加载歌单失败：%s', ex)
+    finally:
+        await pages.aclose()
+
+
+# 跳过确定无法播放的歌曲，全部无法播放时保持原来的位置
+def skip_unavailable(media_player, playindex, step, shuffle=False):
+    cloud_music = media_player.hass.data['cloud_music']
+    playlist = media_player.playlist
+    count = len(playlist)
+    index = playindex
+    for _ in range(count):
+        if not cloud_music.is_track_unavailable(playlist[index]):
+            return index
+        if shuffle:
+            index = random.randint(0, count - 1)
+        else:
+            index = (index + step) % count
+    return playindex
 
 # 上一曲
 async def async_media_previous_track(media_player, shuffle=False):
@@ -820,22 +864,39 @@ async def async_media_previous_track(media_player, shuffle=False):
         playindex = media_player.playindex - 1
         if playindex < 0:
             playindex = count - 1
+    playindex = skip_unavailable(media_player, playindex, -1, shuffle)
     media_player.playindex = playindex
     await media_player.async_play_media(MEDIA_TYPE_MUSIC, playlist[playindex].url)
 
-# 下一曲
-async def async_media_next_track(media_player, shuffle=False):
+# 计算下一曲的位置，repeat为None时表示手动切换，返回None时表示不再播放
+def get_next_playindex(media_player, shuffle=False, repeat=None):
     if hasattr(media_player, 'playlist') == False:
-        return
+        return None
 
-    playindex = media_player.playindex + 1
     playlist = media_player.playlist
     count = len(playlist)
+    # 单曲循环
+    if repeat == 'one':
+        return media_player.playindex
     # 随机
     if shuffle:
-        playindex = random.randint(0, count - 1)
+        # 优先使用预加载时选好的歌曲
+        playindex = getattr(media_player, 'next_playindex', None)
+        if playindex is None or playindex >= count:
+            playindex = random.randint(0, count - 1)
     else:
-        if playindex >= len(playlist):
+        playindex = media_player.playindex + 1
+        if playindex >= count:
+            if repeat == 'off':
+                return None
             playindex = 0
+    return skip_unavailable(media_player, playindex, 1, shuffle)
+
+# 下一曲
+async def async_media_next_track(media_player, shuffle=False, repeat=None):
+    playindex = get_next_playindex(media_player, shuffle, repeat)
+    if playindex is None:
+        return
+
     media_player.playindex = playindex
-    await media_player.async_play_media(MEDIA_TYPE_MUSIC, playlist[playindex].url)
\ No newline at end of file
+    await media_player.async_play_media(MEDIA_TYPE_MUSIC, media_player.playlist[playindex].url)
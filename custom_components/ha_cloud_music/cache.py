@@ -0,0 +1,161 @@
+import time, json, sqlite3, threading
+from collections import OrderedDict
+
+class TTLCache():
+    ''' 内存缓存：按条目过期时间失效，超出条目数或字节数时淘汰最久未使用的条目 '''
+
+    def __init__(self, max_entries=256, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # key -> (过期时间, 字节数, 值)
+        self._data = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        item = self._data.get(key)
+        return item is not None and not self._expired(item)
+
+    def _expired(self, item):
+        return item[0] is not None and item[0] <= time.monotonic()
+
+    def get(self, key, default=None):
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return default
+        if self._expired(item):
+            self.pop(key)
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return item[2]
+
+    def set(self, key, value, ttl=None, size=0):
+        ''' ttl为None时不过期，size为估算的字节数 '''
+        self.pop(key)
+        expires_at = None if ttl is None else time.monotonic() + ttl
+        self._data[key] = (expires_at, size, value)
+        self.bytes += size
+        self._evict()
+
+    def pop(self, key, default=None):
+        item = self._data.pop(key, None)
+        if item is None:
+            return default
+        self.bytes -= item[1]
+        return item[2]
+
+    def clear(self):
+        self._data.clear()
+        self.bytes = 0
+
+    def _evict(self):
+        while len(self._data) > self.max_entries \
+                or (self.max_bytes is not None and self.bytes > self.max_bytes and len(self._data) > 1):
+            key, item = self._data.popitem(last=False)
+            self.bytes -= item[1]
+
+    @property
+    def stats(self):
+        return {
+            'entries': len(self._data),
+            'bytes': self.bytes,
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+class PersistentCache():
+    ''' SQLite磁盘缓存：首次使用时才打开数据库，超出容量时淘汰最久未访问的条目并压缩文件 '''
+
+    def __init__(self, hass, path, max_bytes):
+        self.hass = hass
+        self.path = path
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, '
+                'updated_at REAL NOT NULL, accessed_at REAL NOT NULL)')
+            conn.commit()
+            self.bytes = conn.execute('SELECT COALESCE(SUM(size), 0) FROM cache').fetchone()[0]
+            self._conn = conn
+        return self._conn
+
+    def get(self, key):
+        ''' 返回 (值, 字节数, 更新时间) '''
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute('SELECT value, size, updated_at FROM cache WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute('UPDATE cache SET accessed_at = ? WHERE key = ?', (time.time(), key))
+            conn.commit()
+        return json.loads(row[0]), row[1], row[2]
+
+    def set(self, key, value, text=None):
+        if text is None:
+            text = json.dumps(value, ensure_ascii=False)
+        size = len(text)
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute('SELECT size FROM cache WHERE key = ?', (key,)).fetchone()
+            if row is not None:
+                self.bytes -= row[0]
+            conn.execute('INSERT OR REPLACE INTO cache (key, value, size, updated_at, accessed_at) '
+                'VALUES (?, ?, ?, ?, ?)', (key, text, size, now, now))
+            conn.commit()
+            self.bytes += size
+            if self.bytes > self.max_bytes:
+                self._compact()
+
+    def _compact(self):
+        # 淘汰到容量的80%，避免每次写入都触发压缩
+        target = self.max_bytes * 0.8
+        conn = self._conn
+        rows = conn.execute('SELECT key, size FROM cache ORDER BY accessed_at').fetchall()
+        for key, size in rows:
+            if self.bytes <= target:
+                break
+            conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+            self.bytes -= size
+        conn.commit()
+        conn.execute('VACUUM')
+
+    def clear(self):
+        with self._lock:
+            conn = self._connect()
+            conn.execute('DELETE FROM cache')
+            conn.commit()
+            conn.execute('VACUUM')
+            self.bytes = 0
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    async def async_get(self, key):
+        return await self.hass.async_add_executor_job(self.get, key)
+
+    async def async_set(self, key, value, text=None):
+        await self.hass.async_add_executor_job(self.set, key, value, text)
+
+    async def async_clear(self):
+        await self.hass.async_add_executor_job(self.clear)
+
+    async def async_close(self):
+        await self.hass.async_add_executor_job(self.close)
@@ -1,30 +1,104 @@
-import uuid, time, logging, os, hashlib, aiohttp, requests, base64
+import uuid, time, datetime, logging, os, hashlib, base64, json, asyncio
 from urllib.parse import quote
 from homeassistant.helpers.network import get_url
-from .http_api import http_get, http_cookie
-from .models.music_info import MusicInfo, MusicSource
+from .http_api import http_get, http_cookie, CircuitOpenError, ApiError
+from aiohttp import ClientError
+from .models.music_info import MusicInfo, MusicSource, NETEASE_SOURCES
 from homeassistant.helpers.storage import STORAGE_DIR
 from homeassistant.util.json import load_json
 from homeassistant.helpers.json import save_json
+from homeassistant.helpers.event import async_call_later
 from http.cookies import SimpleCookie
 
 from .browse_media import (
     async_browse_media, 
     async_play_media, 
     async_media_previous_track, 
-    async_media_next_track
+    async_media_next_track,
+    get_next_playindex
 )
 
-from .music_parser import get_music
+from .music_parser import async_get_music
+from .utils import SingleFlight
+from .cache import TTLCache, PersistentCache
+from .const import DISK_CACHE_SIZE
+from .lyrics.store import LyricStore
 
 def md5(data):
     return hashlib.md5(data.encode('utf-8')).hexdigest()
 
 _LOGGER = logging.getLogger(__name__)
 
+# 每日推荐在早上6点刷新
+def seconds_until_daily_refresh():
+    now = datetime.datetime.now()
+    refresh = now.replace(hour=6, minute=0, second=0, microsecond=0)
+    if refresh <= now:
+        refresh = refresh + datetime.timedelta(days=1)
+    return min(86400, int((refresh - now).total_seconds()))
+
+# 接口缓存规则：(地址前缀, 缓存时间（秒）, 是否写入磁盘)，未匹配的接口不缓存
+API_CACHE_TTL = [
+    ('/toplist', 6 * 3600, True),
+    ('/artists', 6 * 3600, True),
+    ('/recommend/resource', seconds_until_daily_refresh, False),
+    ('/recommend/songs', seconds_until_daily_refresh, False),
+    ('/playlist/detail', 10 * 60, True),
+    ('/playlist/track/all', 10 * 60, True),
+    ('/user/playlist', 10 * 60, False),
+    ('/dj/program', 30 * 60, False),
+    ('/dj/sublist', 10 * 60, False),
+    ('/artist/sublist', 10 * 60, False),
+    ('/search', 30 * 60, False),
+    ('/cloudsearch', 30 * 60, False),
+    ('/user/cloud', 60, False),
+]
+
+# 内存缓存上限
+API_CACHE_MAX_ENTRIES = 200
+API_CACHE_MAX_BYTES = 20 * 1024 * 1024
+# 磁盘缓存过期后仍可先返回旧数据的最长时间
+DISK_CACHE_MAX_STALE = 7 * 86400
+
+# 歌单分页大小及并发加载的分页数
+PLAYLIST_PAGE_SIZE = 200
+PLAYLIST_PAGE_CONCURRENCY = 3
+
+# 云盘分页大小，索引增量更新及完整重建的间隔（秒）
+CLOUD_PAGE_SIZE = 200
+CLOUD_INDEX_TTL = 5 * 60
+CLOUD_INDEX_REBUILD = 6 * 3600
+
+# 音乐链接：批量请求数量、预先获取的歌曲数量、缓存数量
+SONG_URL_BATCH_SIZE = 50
+SONG_URL_WINDOW = 5
+SONG_URL_CACHE_SIZE = 1000
+# 音乐链接默认有效期及提前刷新的时间（秒）
+SONG_URL_DEFAULT_EXPIRY = 1200
+SONG_URL_REFRESH_MARGIN = 120
+# 没有链接（无版权、需要会员）的歌曲，多久后重新获取（秒）
+SONG_URL_MISSING_TTL = 10 * 60
+
+# 获取链接失败的缓存：临时失败（网络错误）与确定无法播放
+NEGATIVE_TRANSIENT = 'transient'
+NEGATIVE_UNAVAILABLE = 'unavailable'
+NEGATIVE_TRANSIENT_TTL = 60
+NEGATIVE_UNAVAILABLE_TTL = 6 * 3600
+NEGATIVE_CACHE_SIZE = 1000
+
+# 播放器特性有变化后多久保存（秒），启动耗时每首歌都会更新
+RENDERERS_SAVE_DELAY = 5 * 60
+
+def api_cache_rule(url):
+    path = url.split('?')[0]
+    for prefix, ttl, persist in API_CACHE_TTL:
+        if path == prefix or path.startswith(prefix + '/'):
+            return (ttl() if callable(ttl) else ttl), persist
+    return None, False
+
 class CloudMusic():
 
-    def __init__(self, hass, url) -> None:
+    def __init__(self, hass, url, cache_size=DISK_CACHE_SIZE) -> None:
         self.hass = hass
         self.api_url = url.strip('/')
 
@@ -33,12 +107,37 @@ class CloudMusic():
         self.async_play_media = async_play_media
         self.async_media_previous_track = async_media_previous_track
         self.async_media_next_track = async_media_next_track
+        self.get_next_playindex = get_next_playindex
+
+        # 合并相同的并发请求
+        self.single_flight = SingleFlight()
+        # 接口响应缓存
+        self.api_cache = TTLCache(API_CACHE_MAX_ENTRIES, API_CACHE_MAX_BYTES)
+        # 音乐链接缓存（按链接有效期过期）
+        self.song_url_cache = TTLCache(SONG_URL_CACHE_SIZE)
+        # 获取链接失败的歌曲和关键词
+        self.negative_cache = TTLCache(NEGATIVE_CACHE_SIZE)
+        # 云盘索引
+        self.cloud_index_lock = asyncio.Lock()
+        self.invalidate_cloud_index()
+        # 磁盘缓存（重启后依然可用）
+        self.disk_cache = PersistentCache(hass, self.get_storage_dir('cloud_music.cache.db'), cache_size * 1024 * 1024)
+        # 歌词缓存（与账号无关，登录状态变化时不清除）
+        self.lyric_store = LyricStore(hass, self.get_storage_dir('cloud_music.lyrics.db'))
+        # 已添加的媒体播放器实体
+        self.media_players = {}
 
         self.userinfo = {}
         # 读取用户信息
         self.userinfo_filepath = self.get_storage_dir('cloud_music.userinfo')
         if os.path.exists(self.userinfo_filepath):
             self.userinfo = load_json(self.userinfo_filepath)
+        # 学习到的播放器特性（是否需要暂停/播放才能继续播放等）
+        self.renderers = {}
+        self.renderers_filepath = self.get_storage_dir('cloud_music.renderers')
+        if os.path.exists(self.renderers_filepath):
+            self.renderers = load_json(self.renderers_filepath)
+        self._renderers_save_unsub = None
         # 登录二维码
         self.login_qrcode = {
             'key': None,
@@ -73,6 +172,7 @@ class CloudMusic():
                 'cookie': cookie
             }
             save_json(self.userinfo_filepath, self.userinfo)
+            self.clear_cache()
             return res_data
 
     # 二维码登录
@@ -97,10 +197,12 @@ class CloudMusic():
         res = await self.netease_cloud_music('/user/account')
         self.userinfo['uid'] = res['account']['id']
         save_json(self.userinfo_filepath, self.userinfo)
+        self.clear_cache()
 
     # 退出
     def logout(self):
         self.userinfo = {}
+        self.clear_cache()
         self.login_qrcode = {
             'key': None,
             'time': None,
@@ -124,9 +226,129 @@ class CloudMusic():
         url_encoded_data = quote(encoded_data.decode('utf-8'), safe='-_')
         return f'{base_url}/cloud_music/url?data={url_encoded_data}'
 
+    def get_renderer(self, entity_id):
+        return self.renderers.get(entity_id, {})
+
+    # 记录播放器特性，有变化时延迟保存
+    def update_renderer(self, entity_id, **values):
+        renderer = self.renderers.get(entity_id, {})
+        if all(renderer.get(key) == value for key, value in values.items()):
+            return
+        self.renderers[entity_id] = { **renderer, **values }
+        if self._renderers_save_unsub is None:
+            self._renderers_save_unsub = async_call_later(self.hass, RENDERERS_SAVE_DELAY, self._async_save_renderers)
+
+    async def _async_save_renderers(self, now=None):
+        self._renderers_save_unsub = None
+        await self.hass.async_add_executor_job(save_json, self.renderers_filepath, self.renderers)
+
+    # 保存尚未写入的播放器特性
+    async def async_flush_renderers(self):
+        if self._renderers_save_unsub is not None:
+            self._renderers_save_unsub()
+            await self._async_save_renderers()
+
+    # 当前账号标识
+    @property
+    def cookie_key(self):
+        cookie = self.userinfo.get('cookie', {})
+        return md5(json.dumps(cookie, sort_keys=True))
+
+    # 记录获取失败的歌曲或关键词，网络错误等临时失败只短时间缓存
+    def mark_unavailable(self, key, transient=False):
+        if transient:
+            self.negative_cache.set(key, NEGATIVE_TRANSIENT, NEGATIVE_TRANSIENT_TTL)
+        else:
+            self.negative_cache.set(key, NEGATIVE_UNAVAILABLE, NEGATIVE_UNAVAILABLE_TTL)
+
+    def track_key(self, source, id):
+        return f'track:{source}:{id}'
+
+    def keyword_key(self, keyword):
+        return f'keyword:{keyword}'
+
+    # 歌曲是否确定无法播放
+    def is_track_unavailable(self, music_info):
+        key = self.track_key(music_info.source, music_info.id)
+        return self.negative_cache.get(key) == NEGATIVE_UNAVAILABLE
+
+    # 各内存缓存的条目数、字节数及命中次数
+    @property
+    def cache_stats(self):
+        return {
+            'api': self.api_cache.stats,
+            'song_url': self.song_url_cache.stats,
+            'negative': self.negative_cache.stats,
+            'lyrics': self.lyric_store.memory.stats
+        }
+
+    # 清除缓存（登录状态变化时调用）
+    def clear_cache(self):
+        _LOGGER.debug('清除缓存：%s', self.cache_stats)
+        self.api_cache.clear()
+        self.song_url_cache.clear()
+        self.negative_cache.clear()
+        self.invalidate_cloud_index()
+
+    async def async_close(self):
+        _LOGGER.debug('缓存统计：%s', self.cache_stats)
+        await self.async_flush_renderers()
+        await self.disk_cache.async_close()
+        await self.lyric_store.async_close()
+
+    # 读取缓存：内存 -> 磁盘（过期数据先返回，后台刷新） -> 接口
+    async def async_cached(self, key, ttl, persist, fetch, *args):
+        res = await self._async_cache_lookup(key, ttl, persist, fetch, *args)
+        if res is not None:
+            return res
+        # 相同账号、相同地址的并发请求只调用一次接口
+        return await self.single_flight.run(key, self._async_fetch_cache, key, ttl, persist, fetch, *args)
+
+    # 只读取缓存，没有时返回None；过期数据由fetch在后台刷新
+    async def _async_cache_lookup(self, key, ttl, persist, fetch, *args):
+        res = self.api_cache.get(key)
+        if res is not None:
+            return res
+        if ttl is not None and persist:
+            cached = await self.disk_cache.async_get(key)
+            if cached is not None:
+                res, size, updated_at = cached
+                age = time.time() - updated_at
+                if age < ttl:
+                    self.api_cache.set(key, res, ttl - age, size)
+                    return res
+                if age < DISK_CACHE_MAX_STALE:
+                    if key not in self.single_flight:
+                        self.hass.async_create_task(self._async_revalidate(key, ttl, persist, fetch, *args))
+                    return res
+
+    async def _async_fetch_cache(self, key, ttl, persist, fetch, *args):
+        res = await fetch(*args)
+        await self._async_store_cache(key, ttl, persist, res)
+        return res
+
+    async def _async_store_cache(self, key, ttl, persist, res):
+        # 只缓存请求成功的数据
+        if ttl is not None and isinstance(res, dict) and res.get('code', 200) == 200:
+            text = json.dumps(res, ensure_ascii=False)
+            self.api_cache.set(key, res, ttl, len(text))
+            if persist:
+                await self.disk_cache.async_set(key, res, text)
+
+    async def _async_revalidate(self, key, ttl, persist, fetch, *args):
+        try:
+            await self.single_flight.run(key, self._async_fetch_cache, key, ttl, persist, fetch, *args)
+        except Exception as ex:
+            _LOGGER.debug('后台刷新缓存失败：%s %s', key, ex)
+
     # 网易云音乐接口
     async def netease_cloud_music(self, url):
-        res = await http_get(self.api_url + url, self.userinfo.get('cookie', {}))
+        key = f'{self.cookie_key}:{url}'
+        ttl, persist = api_cache_rule(url)
+        return await self.async_cached(key, ttl, persist, self._netease_cloud_music, url, self.userinfo.get('cookie', {}))
+
+    async def _netease_cloud_music(self, url, cookie):
+        res = await http_get(self.api_url + url, cookie)
         code = res.get('code')
         if code != 200 and code != 801:
             msg = res.get('msg')
@@ -139,40 +361,234 @@ class CloudMusic():
 
     # 获取音乐链接
     async def song_url(self, id):
-        res = await self.netease_cloud_music(f'/song/url/v1?id={id}&level=standard')
-        data = res['data'][0]
-        url = data['url']
-        # 0：免费
-        # 1：收费
-        fee = 0 if data['freeTrialInfo'] is None else 1
-        return url, fee
+        urls = await self.async_song_urls([id])
+        return urls.get(str(id), (None, 0))
+
+    # 批量获取音乐链接，链接在过期前会从缓存中移除，下次获取时重新请求
+    async def async_song_urls(self, ids):
+        result = {}
+        missing = []
+        for id in ids:
+            key = str(id)
+            cached = self.song_url_cache.get(key)
+            if cached is not None:
+                result[key] = cached
+            elif key not in missing:
+                missing.append(key)
+
+        for i in range(0, len(missing), SONG_URL_BATCH_SIZE):
+            batch = ','.join(missing[i:i + SONG_URL_BATCH_SIZE])
+            path = f'/song/url/v1?id={batch}&level=standard'
+            res = await self.netease_cloud_music(path)
+            # 接口出错（限流、登录失效）时没有数据，不能当作没有链接
+            if res.get('code') != 200:
+                raise ApiError(path, res.get('code'))
+            for data in res.get('data', []):
+                key = str(data['id'])
+                url = data['url']
+                # 0：免费
+                # 1：收费
+                fee = 0 if data['freeTrialInfo'] is None else 1
+                result[key] = (url, fee)
+                if url is not None:
+                    ttl = data.get('expi', SONG_URL_DEFAULT_EXPIRY) - SONG_URL_REFRESH_MARGIN
+                    if ttl > 0:
+                        self.song_url_cache.set(key, (url, fee), ttl)
+                else:
+                    self.song_url_cache.set(key, (url, fee), SONG_URL_MISSING_TTL)
+        return result
+
+    # 预先获取播放列表中当前歌曲附近的音乐链接
+    async def async_prefetch_song_urls(self, playlist, playindex, size=SONG_URL_WINDOW):
+        start = max(playindex - 1, 0)
+        ids = [music_info.id for music_info in playlist[start:playindex + size]
+            if music_info.source in NETEASE_SOURCES]
+        if len(ids) > 0:
+            try:
+                await self.async_song_urls(ids)
+            except Exception as ex:
+                _LOGGER.debug('预先获取音乐链接失败：%s', ex)
 
     # 获取云盘音乐链接
     async def cloud_song_url(self, id):
         if self.userinfo.get('uid') is not None:
-            res = await self.netease_cloud_music(f'/user/cloud')
-            filter_list = list(filter(lambda x:x['simpleSong']['id'] == id, res['data']))
-            if len(filter_list) > 0:
-                songId = filter_list[0]['songId']
+            songId = await self.async_cloud_song_id(id)
+            if songId is not None:
                 url, fee = await self.song_url(songId)
                 return url
 
-    # 获取歌单列表
-    async def async_get_playlist(self, playlist_id):
-        res = await self.netease_cloud_music(f'/playlist/track/all?id={playlist_id}&limit=1000')
+    # 云盘索引：歌曲ID -> 云盘songId
+    async def async_cloud_song_id(self, id):
+        async with self.cloud_index_lock:
+            index = self.cloud_index
+            now = time.monotonic()
+            if index['time'] is None or now - index['time'] > CLOUD_INDEX_REBUILD:
+                await self._async_build_cloud_index()
+            elif now - index['time'] > CLOUD_INDEX_TTL:
+                try:
+                    await self._async_update_cloud_index()
+                except ApiError:
+                    # 增量更新失败时旧索引仍可使用，索引中没有时才视为临时失败
+                    if str(id) not in self.cloud_index['songs']:
+                        raise
+            # 重建时会替换索引，需要重新读取
+            return self.cloud_index['songs'].get(str(id))
+
+    # 清除云盘索引（登录状态变化或上传歌曲后调用）
+    def invalidate_cloud_index(self):
+        self.cloud_index = {
+            'songs': {},
+            'ids': set(),
+            'count': None,
+            'time': None
+        }
 
-        def format_playlist(item):
-            id = item['id']
-            song = item['name']
-            singer = item['ar'][0].get('name', '')
-            album = item['al']['name']
-            duration = item['dt']
-            url = self.get_play_url(id, song, singer, MusicSource.PLAYLIST.value)
-            picUrl = item['al'].get('picUrl', 'https://p2.music.126.net/fL9ORyu0e777lppGU3D89A==/109951167206009876.jpg')
-            music_info = MusicInfo(id, song, singer, album, duration, url, picUrl, MusicSource.PLAYLIST.value)
-            return music_info
+    def _add_cloud_items(self, items):
+        index = self.cloud_index
+        for item in items:
+            songId = item['songId']
+            index['ids'].add(songId)
+            simpleSong = item.get('simpleSong')
+            if simpleSong is not None:
+                index['songs'][str(simpleSong['id'])] = songId
+
+    async def _async_cloud_page(self, offset):
+        return await self.netease_cloud_music(f'/user/cloud?limit={CLOUD_PAGE_SIZE}&offset={offset}')
+
+    # 分页获取整个云盘
+    async def _async_build_cloud_index(self):
+        self.invalidate_cloud_index()
+        offset = 0
+        while True:
+            res = await self._async_cloud_page(offset)
+            if res.get('code') != 200:
+                raise ApiError('/user/cloud', res.get('code'))
+            self._add_cloud_items(res['data'])
+            if not res.get('hasMore') or len(res['data']) == 0:
+                break
+            offset += CLOUD_PAGE_SIZE
+        self.cloud_index['count'] = res.get('count')
+        self.cloud_index['time'] = time.monotonic()
+
+    # 增量更新：云盘按上传时间倒序，从头读取直到遇到已索引的歌曲
+    async def _async_update_cloud_index(self):
+        index = self.cloud_index
+        offset = 0
+        while True:
+            res = await self._async_cloud_page(offset)
+            if res.get('code') != 200:
+                raise ApiError('/user/cloud', res.get('code'))
+            count = res.get('count')
+            # 有歌曲被删除时重建索引
+            if count is not None and index['count'] is not None and count < index['count']:
+                await self._async_build_cloud_index()
+                return
+            items = res['data']
+            known = any(item['songId'] in index['ids'] for item in items)
+            self._add_cloud_items(items)
+            if known or not res.get('hasMore') or len(items) == 0:
+                break
+            offset += CLOUD_PAGE_SIZE
+        index['count'] = count
+        index['time'] = time.monotonic()
+
+    # 歌单歌曲格式化
+    def format_playlist_track(self, item):
+        id = item['id']
+        song = item['name']
+        singer = item['ar'][0].get('name', '')
+        album = item['al']['name']
+        duration = item['dt']
+        url = self.get_play_url(id, song, singer, MusicSource.PLAYLIST.value)
+        picUrl = item['al'].get('picUrl', 'https://p2.music.126.net/fL9ORyu0e777lppGU3D89A==/109951167206009876.jpg')
+        music_info = MusicInfo(id, song, singer, album, duration, url, picUrl, MusicSource.PLAYLIST.value)
+        return music_info
+
+    # 分页获取歌单，第一页返回后即可开始播放，其余分页限制并发数后按顺序返回
+    # 各分页不单独缓存（分别过期会导致歌曲重复或缺失），完整加载后整个歌单作为一条缓存
+    async def async_iter_playlist(self, playlist_id, page_size=PLAYLIST_PAGE_SIZE):
+        key = f'{self.cookie_key}:/playlist/track/all?id={playlist_id}'
+        ttl, persist = api_cache_rule('/playlist/track/all')
+        res = await self._async_cache_lookup(key, ttl, persist, self._async_fetch_playlist, playlist_id, page_size)
+        if res is not None:
+            yield list(map(self.format_playlist_track, res['songs']))
+            return
+
+        songs = []
+        result = {'complete': True}
+        async for items in self._async_iter_playlist_pages(playlist_id, page_size, result):
+            songs.extend(items)
+            yield list(map(self.format_playlist_track, items))
+        if result['complete']:
+            await self._async_store_cache(key, ttl, persist, { 'code': 200, 'songs': songs })
+
+    # 获取完整歌单（后台刷新缓存时使用）
+    async def _async_fetch_playlist(self, playlist_id, page_size):
+        songs = []
+        result = {'complete': True}
+        async for items in self._async_iter_playlist_pages(playlist_id, page_size, result):
+            songs.extend(items)
+        return { 'code': 200 if result['complete'] else 500, 'songs': songs }
+
+    # 不经过缓存获取一页歌曲，只保留需要的字段；请求失败时返回None
+    async def _async_playlist_page(self, playlist_id, page_size, offset, cookie):
+        res = await self._netease_cloud_music(f'/playlist/track/all?id={playlist_id}&limit={page_size}&offset={offset}', cookie)
+        if res.get('code') != 200:
+            return None
+        return [{
+            'id': item['id'],
+            'name': item['name'],
+            'ar': item['ar'][:1],
+            'al': { key: item['al'][key] for key in ('name', 'picUrl') if key in item['al'] },
+            'dt': item['dt']
+        } for item in res.get('songs', [])]
+
+    # 逐页返回歌曲数据，直到某一页不足一页；歌曲总数只用于安排并发请求
+    # 中途请求失败时停止，并将result['complete']设为False
+    async def _async_iter_playlist_pages(self, playlist_id, page_size, result):
+        cookie = self.userinfo.get('cookie', {})
+        songs = await self._async_playlist_page(playlist_id, page_size, 0, cookie)
+        if songs is None:
+            result['complete'] = False
+            return
+        yield songs
+        if len(songs) < page_size:
+            return
+
+        detail = await self.netease_cloud_music(f'/playlist/detail?id={playlist_id}')
+        total = detail.get('playlist', {}).get('trackCount') or 0
+        semaphore = asyncio.Semaphore(PLAYLIST_PAGE_CONCURRENCY)
+
+        async def fetch_page(offset):
+            async with semaphore:
+                return await self._async_playlist_page(playlist_id, page_size, offset, cookie)
+
+        offset = page_size
+        while True:
+            # 按总数同时请求剩余分页，总数不准确（缓存的旧数据）时继续逐页请求
+            offsets = range(offset, max(total, offset + 1), page_size)
+            tasks = [asyncio.ensure_future(fetch_page(start)) for start in offsets]
+            try:
+                for task in tasks:
+                    songs = await task
+                    if songs is None:
+                        result['complete'] = False
+                        return
+                    if len(songs) > 0:
+                        yield songs
+                    if len(songs) < page_size:
+                        return
+            finally:
+                for task in tasks:
+                    task.cancel()
+            offset = offsets[-1] + page_size
 
-        return list(map(format_playlist, res['songs']))
+    # 获取歌单列表
+    async def async_get_playlist(self, playlist_id):
+        playlist = []
+        async for items in self.async_iter_playlist(playlist_id):
+            playlist.extend(items)
+        return playlist
 
     # 获取电台列表
     async def async_get_djradio(self, rid):
@@ -276,36 +692,33 @@ class CloudMusic():
             }
 
         headers = self.letingtoutiao['headers']
-        async with aiohttp.ClientSession() as session:
-            # 获取token
-            if headers['token'] == '' or now > self.letingtoutiao['time']:
-                async with session.get('https://app.leting.io/app/auth?uid=' + 
-                    uid + '&appid=a435325b8662a4098f615a7d067fe7b8&ts=1628297581496&sign=4149682cf40c2bf2efcec8155c48b627&v=v9&channel=huawei', 
-                    headers=headers) as res:
-                    r = await res.json()
-                    token = r['data']['token']
-                    headers['token'] = token
-                    # 保存时间（10分钟重新获取token）
-                    self.letingtoutiao['time'] = now + 60 * 10
-                    self.letingtoutiao['headers']['token'] = token
-
-            # 获取播放列表
-            async with session.get('https://app.leting.io/app/url/channel?catalog_id=' + 
-                catalog_id + '&size=100&distinct=1&v=v8&channel=xiaomi', headers=headers) as res:
-                r = await res.json()
+        # 获取token
+        if headers['token'] == '' or now > self.letingtoutiao['time']:
+            r = await http_get('https://app.leting.io/app/auth?uid=' + 
+                headers['uid'] + '&appid=a435325b8662a4098f615a7d067fe7b8&ts=1628297581496&sign=4149682cf40c2bf2efcec8155c48b627&v=v9&channel=huawei', 
+                headers=headers)
+            token = r['data']['token']
+            headers['token'] = token
+            # 保存时间（10分钟重新获取token）
+            self.letingtoutiao['time'] = now + 60 * 10
+            self.letingtoutiao['headers']['token'] = token
+
+        # 获取播放列表
+        r = await http_get('https://app.leting.io/app/url/channel?catalog_id=' + 
+            catalog_id + '&size=100&distinct=1&v=v8&channel=xiaomi', headers=headers)
 
-                def format_playlist(item):
-                    id = item['sid']
-                    song = item['title']
-                    singer = item['source']
-                    album = item['catalog_name']
-                    duration = item['duration']
-                    url = item['audio']
-                    picUrl = item['source_icon']
-                    music_info = MusicInfo(id, song, singer, album, duration, url, picUrl, MusicSource.URL.value)
-                    return music_info
+        def format_playlist(item):
+            id = item['sid']
+            song = item['title']
+            singer = item['source']
+            album = item['catalog_name']
+            duration = item['duration']
+            url = item['audio']
+            picUrl = item['source_icon']
+            music_info = MusicInfo(id, song, singer, album, duration, url, picUrl, MusicSource.URL.value)
+            return music_info
 
-                return list(map(format_playlist, r['data']['data']))
+        return list(map(format_playlist, r['data']['data']))
 
     # 喜马拉雅
     async def async_xmly_playlist(self, id, page=1, size=50, asc=1):
@@ -336,9 +749,16 @@ class CloudMusic():
 
                 return list(map(format_playlist, _list))
 
+    # FM分类
+    async def async_fm_categories(self):
+        url = 'https://rapi.qingting.fm/categories?type=channel'
+        result = await self.async_cached(url, 86400, True, http_get, url)
+        return result['Data']
+
     # FM
     async def async_fm_playlist(self, id, page=1, size=100):
-        result = await http_get(f'https://rapi.qingting.fm/categories/{id}/channels?with_total=true&page={page}&pagesize={size}')
+        url = f'https://rapi.qingting.fm/categories/{id}/channels?with_total=true&page={page}&pagesize={size}'
+        result = await self.async_cached(url, 30 * 60, True, http_get, url)
         data = result['Data']
         # 格式化列表
         def format_playlist(item):
@@ -487,10 +907,20 @@ class CloudMusic():
             }, res['result']['playlists']))
         return _list
 
-    async def async_music_source(self, song, singer=''):
+    async def async_music_source(self, song, singer='', raise_error=False):
         keyword = f'{singer} {song}'.strip()
         _LOGGER.debug(keyword)
 
-        result = await self.hass.async_add_executor_job(get_music, keyword)
+        key = self.keyword_key(keyword)
+        if self.negative_cache.get(key) is not None:
+            return None
+        try:
+            result = await async_get_music(keyword)
+        except (ClientError, asyncio.TimeoutError, CircuitOpenError):
+            self.mark_unavailable(key, transient=True)
+            if raise_error:
+                raise
+            return None
         if result is not None:
-            return result
\ No newline at end of file
+            return result
+        self.mark_unavailable(key)
\ No newline at end of file
@@ -13,6 +13,7 @@ from homeassistant.helpers.selector import selector
 
 from .manifest import manifest
 from .http_api import fetch_data
+from .const import DISK_CACHE_SIZE
 
 DOMAIN = manifest.domain
 
@@ -81,7 +82,16 @@ class OptionsFlowHandler(OptionsFlow):
                     "options": media_entities,
                     "multiple": True
                 }
-            })            
+            }),
+            vol.Optional('cache_size', default=options.get('cache_size', DISK_CACHE_SIZE)): selector({
+                "number": {
+                    "min": 10,
+                    "max": 1000,
+                    "step": 10,
+                    "unit_of_measurement": "MB",
+                    "mode": "box"
+                }
+            })
         })
         return self.async_show_form(step_id="user", data_schema=DATA_SCHEMA, errors=errors)
         
\ No newline at end of file
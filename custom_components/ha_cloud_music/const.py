@@ -1 +1,4 @@
-PLATFORMS = ["media_player"]
\ No newline at end of file
+PLATFORMS = ["media_player"]
+
+# 磁盘缓存上限（MB），可在集成选项中修改
+DISK_CACHE_SIZE = 50
@@ -78,24 +78,41 @@ class LyricsCardEditor extends HTMLElement {
 customElements.define('lyrics-card-editor', LyricsCardEditor);
 console.log('Registered lyrics-card-editor');
 
+// 订阅歌词失败后重试的最小、最大间隔（毫秒）
+const RETRY_MIN_DELAY = 1000;
+const RETRY_MAX_DELAY = 60000;
+
 class LyricsCard extends HTMLElement {
     constructor() {
         super();
         this.attachShadow({ mode: 'open' });
         this._config = {};
-        this._previousLyric = '';
-        this._currentLyric = '';
-        this._nextLyric = '';
-        this._lyricsHistory = [];
+        // 完整歌词（每首歌获取一次）和播放锚点，当前歌词在本地按进度计算
+        this._lyrics = null;
+        this._anchor = null;
+        this._index = null;
+        this._unsubscribe = null;
+        this._subscribedEntity = null;
         this._animationFrame = null;
+        // 订阅失败后的重试时间和间隔
+        this._retryAt = 0;
+        this._retryDelay = RETRY_MIN_DELAY;
     }
 
     setConfig(config) {
         this._config = config;
         this._render();
+        this._subscribe();
+    }
+
+    connectedCallback() {
+        this._subscribe();
     }
-    
 
+    disconnectedCallback() {
+        this._unsubscribeLyrics();
+    }
+    
     _render() {
         console.log('Entering _render method of', this.constructor.name);
         this.shadowRoot.innerHTML = `
@@ -104,6 +121,7 @@ class LyricsCard extends HTMLElement {
                     <div class="lyrics-wrapper">
                         <div class="previous-lyric"></div>
                         <div class="current-lyric"></div>
+                        <div class="translation-lyric"></div>
                         <div class="next-lyric"></div>
                     </div>
                 </div>
@@ -155,6 +173,18 @@ class LyricsCard extends HTMLElement {
                     text-overflow: ellipsis;
                     white-space: nowrap;
                 }
+                .translation-lyric {
+                    width: 100%;
+                    text-align: center;
+                    color: var(--secondary-text-color);
+                    font-size: 0.95em;
+                    overflow: hidden;
+                    text-overflow: ellipsis;
+                    white-space: nowrap;
+                }
+                .translation-lyric:empty {
+                    display: none;
+                }
                 .current-lyric {
                     color: var(--primary-text-color);
                     font-size: 1.3em;
@@ -185,55 +215,147 @@ class LyricsCard extends HTMLElement {
         this.currentLyric = this.shadowRoot.querySelector('.current-lyric');
         this.previousLyric = this.shadowRoot.querySelector('.previous-lyric');
         this.nextLyric = this.shadowRoot.querySelector('.next-lyric');
-        
-        if (this._hass) {
-            this.updateContent();
-        }
+        this.translationLyric = this.shadowRoot.querySelector('.translation-lyric');
+        this._index = null;
+        this.updateContent();
     }
 
     set hass(hass) {
         this._hass = hass;
+        this._subscribe();
+    }
+
+    // 订阅歌词，实体变化时重新订阅；实体存在时才订阅，失败后按间隔重试
+    async _subscribe() {
+        const entityId = this._config.entity;
+        if (!this._hass || !entityId || !this.isConnected || this._subscribedEntity === entityId) return;
+        if (!this._hass.states[entityId] || Date.now() < this._retryAt) return;
+        this._unsubscribeLyrics();
+        this._subscribedEntity = entityId;
+        try {
+            const unsubscribe = await this._hass.connection.subscribeMessage(
+                (message) => this._handleMessage(message),
+                { type: 'ha_cloud_music/lyrics/subscribe', entity_id: entityId }
+            );
+            if (this._subscribedEntity !== entityId) {
+                unsubscribe();
+                return;
+            }
+            this._unsubscribe = unsubscribe;
+            this._retryAt = 0;
+            this._retryDelay = RETRY_MIN_DELAY;
+        } catch (err) {
+            console.warn('订阅歌词失败', entityId, err);
+            if (this._subscribedEntity === entityId) {
+                this._subscribedEntity = null;
+            }
+            this._retryAt = Date.now() + this._retryDelay;
+            this._retryDelay = Math.min(this._retryDelay * 2, RETRY_MAX_DELAY);
+        }
+    }
+
+    _unsubscribeLyrics() {
+        if (this._unsubscribe) {
+            this._unsubscribe();
+            this._unsubscribe = null;
+        }
+        this._subscribedEntity = null;
+        this._stopLoop();
+    }
+
+    _handleMessage(message) {
+        if (message.type === 'lyrics') {
+            // 新的歌曲或歌词加载完成
+            this._lyrics = message;
+            this._index = null;
+            this._setAnchor(message.anchor);
+        } else if (message.type === 'anchor') {
+            this._setAnchor(message);
+        } else if (message.type === 'end') {
+            // 实体已移除（重新加载集成等），等实体重新出现后再订阅
+            this._unsubscribeLyrics();
+            this._lyrics = null;
+            this._anchor = null;
+            this._render();
+        }
+    }
+
+    _setAnchor(anchor) {
+        this._anchor = {
+            ...anchor,
+            time: anchor.updated_at ? Date.parse(anchor.updated_at) : Date.now()
+        };
         this.updateContent();
+        if (anchor.state === 'playing') {
+            this._startLoop();
+        } else {
+            this._stopLoop();
+        }
     }
 
-    updateContent() {
-        if (!this._hass) return;
+    // 按显示刷新频率计算当前歌词
+    _startLoop() {
+        if (this._animationFrame) return;
+        const loop = () => {
+            this.updateContent();
+            this._animationFrame = requestAnimationFrame(loop);
+        };
+        this._animationFrame = requestAnimationFrame(loop);
+    }
 
-        const entity = this._hass.states[this._config.entity];
-        if (!entity) return;
-
-        const currentLyric = entity.attributes.current_lyric || '';
-        const nextLyric = entity.attributes.next_lyric;
-        const mediaTitle = entity.attributes.media_title || '';
-        const mediaArtist = entity.attributes.media_artist || '';
-        
-        if (currentLyric && currentLyric !== this._currentLyric) {
-            console.log('Updating lyrics:', {
-                previous: this._previousLyric,
-                current: currentLyric,
-                next: nextLyric
-            });
-
-            // 更新歌词显示
-            this._previousLyric = this._currentLyric;
-            this._currentLyric = currentLyric;
-            this._nextLyric = nextLyric;
-            
-            // 更新DOM
-            if (this._previousLyric) {
-                this.previousLyric.textContent = this._previousLyric;
+    _stopLoop() {
+        if (this._animationFrame) {
+            cancelAnimationFrame(this._animationFrame);
+            this._animationFrame = null;
+        }
+    }
+
+    _position() {
+        const anchor = this._anchor;
+        if (!anchor) return 0;
+        if (anchor.state !== 'playing') return anchor.position;
+        return anchor.position + (Date.now() - anchor.time) / 1000;
+    }
+
+    // 二分查找当前歌词行，第一句之前为-1
+    _indexAt(times, position) {
+        let low = 0;
+        let high = times.length;
+        while (low < high) {
+            const mid = (low + high) >> 1;
+            if (times[mid] <= position) {
+                low = mid + 1;
             } else {
-                this.previousLyric.textContent = `${mediaTitle} - ${mediaArtist}`;
+                high = mid;
             }
-            
-            this.currentLyric.textContent = this._currentLyric;
-            this.nextLyric.textContent = this._nextLyric || '';
-            
-            // 添加动画效果
-            this.currentLyric.classList.remove('lyric-enter');
-            void this.currentLyric.offsetWidth; // 触发重绘
-            this.currentLyric.classList.add('lyric-enter');
         }
+        return low - 1;
+    }
+
+    updateContent() {
+        const lyrics = this._lyrics;
+        if (!lyrics || !this.currentLyric) return;
+
+        const times = lyrics.times || [];
+        const texts = lyrics.texts || [];
+        const index = this._indexAt(times, this._position());
+        if (index === this._index) return;
+        this._index = index;
+
+        const mediaTitle = lyrics.media_title || '';
+        const mediaArtist = lyrics.media_artist || '';
+        const translations = lyrics.translations || [];
+
+        // 更新DOM
+        this.previousLyric.textContent = index > 0 ? texts[index - 1] : `${mediaTitle} - ${mediaArtist}`;
+        this.currentLyric.textContent = index >= 0 ? texts[index] : '';
+        this.translationLyric.textContent = (index >= 0 && translations[index]) || '';
+        this.nextLyric.textContent = texts[index + 1] || '';
+
+        // 添加动画效果
+        this.currentLyric.classList.remove('lyric-enter');
+        void this.currentLyric.offsetWidth; // 触发重绘
+        this.currentLyric.classList.add('lyric-enter');
     }
 
     getCardSize() {
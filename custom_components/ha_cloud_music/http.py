@@ -1,26 +1,52 @@
-import base64
-import requests
+import base64, logging, asyncio, json
+from http import HTTPStatus
 from urllib.parse import parse_qsl, quote
 from homeassistant.components.http import HomeAssistantView
-from aiohttp import web
+from aiohttp import web, ClientError
 from .models.music_info import MusicSource
 from .manifest import manifest
+from .http_api import CircuitOpenError, ApiError, http_request, read_text
+from .cache import TTLCache
+from .utils import SingleFlight, async_hedge
+from .cloud_music import NEGATIVE_TRANSIENT
 
 DOMAIN = manifest.domain
 
+_LOGGER = logging.getLogger(__name__)
+
+VIP_API = 'https://music.dogged.cn/api.php'
+
+# 播放链接缓存数量及有效期（秒）
+PLAY_CACHE_SIZE = 200
+PLAY_CACHE_TTL = 10 * 60
+
+# 获取播放链接的环节，按顺序启动
+RESOLVE_STAGES = ['song_url', 'vip', 'cloud', 'music_source']
+# 前一个环节超过该时间（秒）没有结果时，同时启动下一个环节；为0时全部同时启动
+HEDGE_DELAY = 0.8
+# 记录每首歌成功获取链接的环节数量及有效期（秒），过期后重新按默认顺序尝试
+STAGE_WINNER_SIZE = 1000
+STAGE_WINNER_TTL = 24 * 3600
+
 class HttpView(HomeAssistantView):
 
     url = "/cloud_music/url"
     name = f"cloud_music:url"
     requires_auth = False
 
-    play_key = None
-    play_url = None
+    # 已解析的播放链接，按歌曲和来源区分
+    play_cache = TTLCache(PLAY_CACHE_SIZE)
+    # 相同歌曲的并发请求只解析一次
+    single_flight = SingleFlight()
+    # 获取链接的环节配置
+    resolve_stages = RESOLVE_STAGES
+    hedge_delay = HEDGE_DELAY
+    # 每首歌上次成功获取链接的环节，下次优先使用
+    stage_winners = TTLCache(STAGE_WINNER_SIZE)
 
     async def get(self, request):
 
         hass = request.app["hass"]
-        cloud_music = hass.data['cloud_music']
 
         query = {}
         data = request.query.get('data')
@@ -35,55 +61,136 @@ class HttpView(HomeAssistantView):
         song = query.get('song')
         singer = query.get('singer')
 
-        not_found_tips = quote(f'当前没有找到编号是{id}，歌名为{song}，作者是{singer}的播放链接')
-        play_url = f'http://fanyi.baidu.com/gettts?lan=zh&text={not_found_tips}&spd=5&source=web'
+        play_url = await self.async_play_url(hass, id, song, singer, source)
+        # 重定向到可播放链接
+        return web.HTTPFound(play_url)
 
+    # 获取播放链接，优先使用缓存；没有找到时返回语音提示，fallback为False时返回None
+    async def async_play_url(self, hass, id, song, singer, source, fallback=True):
         # 缓存KEY
-        play_key = f'{id}{song}{singer}{source}'
-        if self.play_key == play_key:
-            return web.HTTPFound(self.play_url)
+        play_key = f'{source}:{id}:{song}:{singer}'
+        play_url = self.play_cache.get(play_key)
+        if play_url is None:
+            play_url = await self.single_flight.run(play_key, self.async_resolve, hass, play_key, id, song, singer, source)
+        if play_url is None and fallback:
+            not_found_tips = quote(f'当前没有找到编号是{id}，歌名为{song}，作者是{singer}的播放链接')
+            play_url = f'http://fanyi.baidu.com/gettts?lan=zh&text={not_found_tips}&spd=5&source=web'
+        return play_url
+
+    # 解析播放链接，没有找到时返回None
+    async def async_resolve(self, hass, play_key, id, song, singer, source):
+        cloud_music = hass.data['cloud_music']
 
         source = int(source)
-        if source == MusicSource.PLAYLIST.value \
-                or source == MusicSource.ARTISTS.value \
-                or source == MusicSource.DJRADIO.value \
-                or source == MusicSource.CLOUD.value:
-            # 获取播放链接
-            url, fee = await cloud_music.song_url(id)
-            if url is not None:
-                # 收费音乐
-                if fee == 1:
-                    url = await hass.async_add_executor_job(self.getVipMusic, id)
-                    if url is None or url == '':
-                        result = await cloud_music.async_music_source(song, singer)
-                        if result is not None:
-                            url = result.url
-
-                play_url = url
-            else:
-                # 从云盘里获取
-                url = await cloud_music.cloud_song_url(id)
-                if url is not None:
-                    play_url = url
-                else:
-                    result = await cloud_music.async_music_source(song, singer)
-                    if result is not None:
-                        play_url = result.url
-
-        self.play_key = play_key
-        self.play_url = play_url     
-        # 重定向到可播放链接
-        return web.HTTPFound(play_url)
+        if source not in (MusicSource.PLAYLIST.value, MusicSource.ARTISTS.value,
+                MusicSource.DJRADIO.value, MusicSource.CLOUD.value):
+            return None
+
+        # 最近确定无法播放或刚刚失败过的歌曲，不再重复获取
+        track_key = cloud_music.track_key(source, id)
+        if cloud_music.negative_cache.get(track_key) is not None:
+            return None
+
+        # 收费音乐的试听链接，其他环节都失败时使用
+        trial = {}
+        # 各环节出现的网络错误及其他异常，有错误时只短时间记录失败
+        errors = []
+
+        async def song_url():
+            result = await self.async_try(cloud_music.song_url(id), errors)
+            if result is not None:
+                url, fee = result
+                if fee == 0:
+                    return url
+                trial['url'] = url
+
+        async def vip():
+            return await self.async_try(self.async_vip_music(id), errors)
+
+        async def cloud():
+            return await self.async_try(cloud_music.cloud_song_url(id), errors)
+
+        async def music_source():
+            result = await self.async_try(cloud_music.async_music_source(song, singer, raise_error=True), errors)
+            if result is not None:
+                return result.url
+
+        stages = {
+            'song_url': song_url,
+            'vip': vip,
+            'cloud': cloud,
+            'music_source': music_source
+        }
+        names = list(self.resolve_stages)
+        # 上次成功的环节最先启动
+        winner_key = f'{source}:{id}'
+        winner = self.stage_winners.get(winner_key)
+        if winner in names:
+            names.remove(winner)
+            names.insert(0, winner)
+
+        # 没有获取到链接的环节
+        failed = set()
+
+        async def run_stage(name):
+            result = await stages[name]()
+            if not result:
+                failed.add(name)
+            return result
+
+        name, play_url = await async_hedge([(name, lambda name=name: run_stage(name)) for name in names], self.hedge_delay, errors)
+        if play_url is None:
+            # 没有找到时不缓存播放链接；出现网络错误时只短时间记录失败
+            if trial.get('url'):
+                return trial['url']
+            keyword_key = cloud_music.keyword_key(f'{singer} {song}'.strip())
+            transient = len(errors) > 0 or cloud_music.negative_cache.get(keyword_key) == NEGATIVE_TRANSIENT
+            cloud_music.mark_unavailable(track_key, transient=transient)
+            return None
+
+        _LOGGER.debug('%s 通过 %s 获取到播放链接', winner_key, name)
+        # 默认顺序中排在前面的环节都确定没有链接时才记录，避免较慢的官方链接输给后面的备用环节
+        if all(stage in failed for stage in self.resolve_stages[:self.resolve_stages.index(name)]):
+            self.stage_winners.set(winner_key, name, STAGE_WINNER_TTL)
+        self.play_cache.set(play_key, play_url, PLAY_CACHE_TTL)
+        return play_url
+
+    # 单个环节失败或所在站点已熔断时，直接进入下一个环节
+    async def async_try(self, coro, errors=None):
+        try:
+            return await coro
+        except CircuitOpenError as ex:
+            _LOGGER.debug('跳过已熔断的站点：%s', ex.host)
+            if errors is not None:
+                errors.append(ex)
+        except (ClientError, asyncio.TimeoutError, ApiError) as ex:
+            _LOGGER.warning('获取播放链接失败：%s', ex)
+            if errors is not None:
+                errors.append(ex)
 
     # VIP音乐资源
-    def getVipMusic(self, id):
+    async def async_vip_music(self, id):
+        text = await http_request(VIP_API, method='POST', reader=read_text, data={
+            'types': 'url',
+            'id': id,
+            'source': 'netease'
+        })
         try:
-            res = requests.post('https://music.dogged.cn/api.php', data={
-                'types': 'url',
-                'id': id,
-                'source': 'netease'
-            })
-            data = res.json()
-            return data.get('url')
-        except Exception as ex:
+            return json.loads(text).get('url')
+        except (ValueError, AttributeError):
             pass
+
+class LyricsView(HomeAssistantView):
+    ''' 获取媒体播放器当前歌曲的完整歌词 '''
+
+    url = "/cloud_music/lyrics"
+    name = f"cloud_music:lyrics"
+    requires_auth = True
+
+    async def get(self, request):
+        hass = request.app["hass"]
+        entity_id = request.query.get('entity_id')
+        media_player = hass.data['cloud_music'].media_players.get(entity_id)
+        if media_player is None:
+            return self.json_message('媒体播放器不存在', HTTPStatus.NOT_FOUND)
+        return self.json(media_player.lyrics_data)
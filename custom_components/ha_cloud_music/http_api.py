@@ -1,4 +1,4 @@
-import json, aiohttp
+import json, time, random, asyncio, aiohttp
 from urllib.parse import urlparse
 
 # 全局请求头
@@ -6,42 +6,177 @@ HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/105.0.0.0 Safari/537.36 Edg/105.0.1343.50'
 }
 
+# 连接池配置
+CONNECTION_LIMIT = 100
+CONNECTION_LIMIT_PER_HOST = 10
+DNS_CACHE_TTL = 300
+KEEPALIVE_TIMEOUT = 30
+
+# 请求超时（秒），未配置的域名使用默认值
+DEFAULT_TIMEOUT = 10
+HOST_TIMEOUTS = {
+    'music.163.com': 5,
+    'app.leting.io': 8,
+    'rapi.qingting.fm': 8,
+    'mobile.ximalaya.com': 8,
+    'm.ximalaya.com': 8,
+    'music.dogged.cn': 8,
+    'www.fangpi.net': 10,
+}
+
+# GET请求失败重试次数及退避基数（秒）
+RETRY_COUNT = 2
+RETRY_BACKOFF = 0.3
+
+# 熔断：连续失败次数达到阈值后，在冷却时间内直接失败
+BREAKER_THRESHOLD = 5
+BREAKER_RESET_TIMEOUT = 30
+
+# 共享会话（集成卸载时关闭）
+_SESSION = None
+# 各域名的熔断器
+_BREAKERS = {}
+
+class CircuitOpenError(Exception):
+    ''' 域名已熔断，请求未发出 '''
+
+    def __init__(self, host):
+        super().__init__(f'{host} 暂时不可用')
+        self.host = host
+
+class ApiError(Exception):
+    ''' 接口返回错误码（限流、登录失效等），属于临时失败 '''
+
+    def __init__(self, url, code):
+        super().__init__(f'{url} 返回错误码 {code}')
+        self.url = url
+        self.code = code
+
+class CircuitBreaker():
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None and time.monotonic() - self.opened_at < self.reset_timeout
+
+    def allow(self):
+        ''' 熔断冷却结束后放行请求进行探测，探测失败会重新熔断 '''
+        return not self.is_open
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+def get_breaker(url):
+    host = urlparse(url).hostname if '://' in url else url
+    breaker = _BREAKERS.get(host)
+    if breaker is None:
+        breaker = _BREAKERS[host] = CircuitBreaker()
+    return breaker
+
+def get_timeout(url):
+    host = urlparse(url).hostname
+    return HOST_TIMEOUTS.get(host, DEFAULT_TIMEOUT)
+
+def get_session():
+    ''' 获取共享的长连接会话 '''
+    global _SESSION
+    if _SESSION is None or _SESSION.closed:
+        connector = aiohttp.TCPConnector(
+            limit=CONNECTION_LIMIT,
+            limit_per_host=CONNECTION_LIMIT_PER_HOST,
+            ttl_dns_cache=DNS_CACHE_TTL,
+            keepalive_timeout=KEEPALIVE_TIMEOUT
+        )
+        # cookie按请求传入，不在会话中共享，避免不同账号的凭据串用
+        _SESSION = aiohttp.ClientSession(
+            connector=connector,
+            headers=HEADERS,
+            cookie_jar=aiohttp.DummyCookieJar()
+        )
+    return _SESSION
+
+async def async_close_session():
+    ''' 关闭共享会话 '''
+    global _SESSION
+    session = _SESSION
+    _SESSION = None
+    if session is not None and not session.closed:
+        await session.close()
+
+async def read_json(resp):
+    return await resp.json()
+
+async def read_text(resp):
+    return await resp.text()
+
+async def read_status(resp):
+    return resp.status
+
+async def http_request(url, method='GET', reader=read_json, retries=None, **kwargs):
+    ''' 带超时、重试和熔断的请求，reader在连接释放前读取响应内容 '''
+    breaker = get_breaker(url)
+    if not breaker.allow():
+        raise CircuitOpenError(urlparse(url).hostname)
+    # 只有幂等的GET请求才重试
+    if retries is None:
+        retries = RETRY_COUNT if method == 'GET' else 0
+    kwargs.setdefault('timeout', aiohttp.ClientTimeout(total=get_timeout(url)))
+    session = get_session()
+    attempt = 0
+    while True:
+        try:
+            async with session.request(method, url, **kwargs) as resp:
+                if resp.status >= 500:
+                    resp.raise_for_status()
+                result = await reader(resp)
+            breaker.record_success()
+            return result
+        except (aiohttp.ClientConnectionError, aiohttp.ClientResponseError, asyncio.TimeoutError) as ex:
+            # 响应格式错误不是服务故障
+            if isinstance(ex, aiohttp.ContentTypeError):
+                raise
+            if attempt >= retries:
+                breaker.record_failure()
+                raise
+            attempt += 1
+            await asyncio.sleep(RETRY_BACKOFF * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5))
+
 # 获取cookie
 async def http_cookie(url):
     COOKIES = {'os': 'osx'}
-    jar = aiohttp.CookieJar(unsafe=True)
-    location = urlparse(url)
-    location_orgin = f'{location.scheme}://{location.netloc}'
-    async with aiohttp.ClientSession(headers=HEADERS, cookies=COOKIES, cookie_jar=jar) as session:
-            async with session.get(url) as resp:
-                cookies = session.cookie_jar.filter_cookies(location_orgin)
-                for key, cookie in cookies.items():
-                    COOKIES[key] = cookie.value
-                result = await resp.json()
-                return {
-                    'cookie': COOKIES,
-                    'data': result
-                }
-
-async def http_get(url, COOKIES={}):
-    headers = {'Referer': url, **HEADERS}
-    jar = aiohttp.CookieJar(unsafe=True)
-    async with aiohttp.ClientSession(headers=headers, cookies=COOKIES, cookie_jar=jar) as session:
-        async with session.get(url) as resp:
-            # 喜马拉雅返回的是文本内容
-            if 'https://mobile.ximalaya.com/mobile/' in url:
-                result = json.loads(await resp.text())
-            else:
-                result = await resp.json()
-            return result
+
+    async def reader(resp):
+        for key, cookie in resp.cookies.items():
+            COOKIES[key] = cookie.value
+        return await resp.json()
+
+    result = await http_request(url, reader=reader, cookies=COOKIES)
+    return {
+        'cookie': COOKIES,
+        'data': result
+    }
+
+async def http_get(url, COOKIES={}, headers=None):
+    headers = {'Referer': url, **(headers or {})}
+    # 喜马拉雅返回的是文本内容
+    if 'https://mobile.ximalaya.com/mobile/' in url:
+        return json.loads(await http_request(url, reader=read_text, headers=headers, cookies=COOKIES))
+    return await http_request(url, headers=headers, cookies=COOKIES)
 
 async def http_code(url):
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as response:
-            return response.status
+    return await http_request(url, reader=read_status)
 
 async def fetch_data(url):
     timeout = aiohttp.ClientTimeout(total=5)
-    async with aiohttp.ClientSession(timeout=timeout) as session:
-        async with session.get(url) as response:
-            return await response.json()
\ No newline at end of file
+    return await http_request(url, timeout=timeout, retries=0)
@@ -1,137 +1,243 @@
 import re
-from typing import List, Dict, Optional
-import aiohttp
-import asyncio
 import json
-import base64
-from Crypto.Cipher import AES
-import random
-import codecs
+from bisect import bisect_right
+from typing import List, Dict, Optional, Tuple
 import logging
 
 _LOGGER = logging.getLogger(__name__)
 
+# 时间标签 [mm:ss]、[mm:ss.xx]、[mm:ss:xx]，一行可以有多个
+TIME_TAG_PATTERN = re.compile(r'\[(\d{1,3}):(\d{1,2})(?:[.:](\d{1,3}))?\]')
+# 信息标签 [ti:标题]、[ar:歌手]、[offset:500] 等
+META_TAG_PATTERN = re.compile(r'\[([a-zA-Z#]+):([^\]]*)\]')
+# 网易云逐字歌词：[行开始,行时长](字开始,字时长,0)字...，单位毫秒
+YRC_LINE_PATTERN = re.compile(r'\[(\d+),(\d+)\]')
+YRC_WORD_PATTERN = re.compile(r'\((\d+),(\d+),-?\d+\)((?:(?!\(\d+,\d+,-?\d+\)).)*)')
+# 翻译、罗马音与原文对齐时允许的时间误差（秒），逐字歌词与LRC的时间会有少量偏差
+ALIGN_TOLERANCE = 1.0
+# 游标向后逐行移动的最大行数，超过时（快进）改用二分查找
+CURSOR_SCAN_LIMIT = 8
+
+# 逐字时间：(开始时间, 时长, 文字)，单位秒
+Word = Tuple[float, float, str]
+
 class LyricLine:
-    def __init__(self, time: float, text: str):
+    def __init__(self, time: float, text: str, duration: Optional[float] = None, words: Optional[Tuple[Word, ...]] = None):
         self.time = time
         self.text = text
+        self.duration = duration
+        self.words = words
+
+class LyricTimeline:
+    """按时间排序的歌词，时间和文本分开存放，便于二分查找（只读，可在多个播放器间共享）"""
+
+    def __init__(self, lines: List[LyricLine] = (), metadata: Optional[Dict[str, str]] = None):
+        lines = sorted(lines, key=lambda x: x.time)
+        self.times: List[float] = [line.time for line in lines]
+        self.texts: List[str] = [line.text for line in lines]
+        # 只有逐字歌词才有行时长和逐字时间
+        self.durations: Optional[List[Optional[float]]] = None
+        self.words: Optional[List[Optional[Tuple[Word, ...]]]] = None
+        if any(line.words for line in lines):
+            self.durations = [line.duration for line in lines]
+            self.words = [line.words for line in lines]
+        self.metadata: Dict[str, str] = metadata or {}
+        # 与原文对齐的翻译和罗马音，没有时为None
+        self.translations: Optional[List[Optional[str]]] = None
+        self.romanizations: Optional[List[Optional[str]]] = None
+
+    def align(self, other: 'LyricTimeline', tolerance: float = ALIGN_TOLERANCE) -> Optional[List[Optional[str]]]:
+        """按时间将另一份歌词对齐到每一行（两份歌词都已排序，一次遍历完成）"""
+        if len(other) == 0:
+            return None
+        result = []
+        times = other.times
+        count = len(times)
+        j = 0
+        for time in self.times:
+            # 移动到时间最接近的一行
+            while j + 1 < count and abs(times[j + 1] - time) <= abs(times[j] - time):
+                j += 1
+            result.append(other.texts[j] if abs(times[j] - time) <= tolerance else None)
+        return result
+
+    def __len__(self):
+        return len(self.times)
+
+    def as_dict(self) -> Dict:
+        """完整时间轴，供前端按需获取"""
+        return {
+            'times': self.times,
+            'texts': self.texts,
+            'durations': self.durations,
+            'words': self.words,
+            'translations': self.translations,
+            'romanizations': self.romanizations,
+            'metadata': self.metadata
+        }
+
+    def index_at(self, current_time: float) -> int:
+        """当前时间对应的行号，第一句之前为-1"""
+        return bisect_right(self.times, current_time) - 1
+
+    def word_index_at(self, index: int, current_time: float) -> int:
+        """第index行中正在唱的字，用于卡拉OK高亮；没有逐字时间时返回-1"""
+        if self.words is None or index < 0 or not self.words[index]:
+            return -1
+        words = self.words[index]
+        position = 0
+        while position + 1 < len(words) and words[position + 1][0] <= current_time:
+            position += 1
+        return position
+
+def _parse_offset(value: str) -> float:
+    try:
+        return int(value.strip()) / 1000
+    except ValueError:
+        return 0
+
+def _parse_credit(line: str) -> Optional[str]:
+    # 网易云歌词开头的JSON行（作词、作曲等）
+    try:
+        data = json.loads(line)
+        return ''.join(item.get('tx', '') for item in data.get('c', []))
+    except (ValueError, AttributeError):
+        return None
+
+def parse_lrc(lrc_content: str) -> LyricTimeline:
+    """解析LRC格式的歌词，支持一行多个时间标签和 [offset:] 偏移"""
+    lines = []
+    metadata = {}
+    credits = []
+    for raw in (lrc_content or '').splitlines():
+        line = raw.strip()
+        if not line:
+            continue
+        if line[0] == '{':
+            credit = _parse_credit(line)
+            if credit:
+                credits.append(credit)
+            continue
+        # 行首连续的时间标签共用同一句歌词
+        times = []
+        pos = 0
+        match = TIME_TAG_PATTERN.match(line, pos)
+        while match:
+            minutes, seconds, fraction = match.groups()
+            time = int(minutes) * 60 + int(seconds)
+            if fraction:
+                time += int(fraction) / (10 ** len(fraction))
+            times.append(time)
+            pos = match.end()
+            match = TIME_TAG_PATTERN.match(line, pos)
+        if times:
+            text = line[pos:].strip()
+            if text:  # 只添加非空歌词
+                for time in times:
+                    lines.append(LyricLine(time, text))
+            continue
+        match = META_TAG_PATTERN.fullmatch(line)
+        if match:
+            metadata[match.group(1).lower()] = match.group(2).strip()
+
+    # 偏移为正时歌词提前显示
+    offset = _parse_offset(metadata.get('offset', '0'))
+    if offset:
+        for item in lines:
+            item.time = max(item.time - offset, 0)
+    if credits:
+        metadata['credits'] = ' / '.join(credits)
+    return LyricTimeline(lines, metadata)
+
+def parse_yrc(yrc_content: str) -> LyricTimeline:
+    """解析网易云逐字歌词（yrc）"""
+    lines = []
+    metadata = {}
+    credits = []
+    for raw in (yrc_content or '').splitlines():
+        line = raw.strip()
+        if not line:
+            continue
+        if line[0] == '{':
+            credit = _parse_credit(line)
+            if credit:
+                credits.append(credit)
+            continue
+        match = YRC_LINE_PATTERN.match(line)
+        if match is None:
+            continue
+        words = tuple(
+            (int(start) / 1000, int(duration) / 1000, text)
+            for start, duration, text in YRC_WORD_PATTERN.findall(line, match.end())
+        )
+        text = ''.join(word[2] for word in words).strip()
+        if text:
+            lines.append(LyricLine(int(match.group(1)) / 1000, text, int(match.group(2)) / 1000, words))
+    if credits:
+        metadata['credits'] = ' / '.join(credits)
+    return LyricTimeline(lines, metadata)
 
 class LyricParser:
     def __init__(self):
-        self.lyrics: List[LyricLine] = []
-        self.current_index = 0
-        self.headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Referer': 'https://music.163.com/',
-            'Origin': 'https://music.163.com'
-        }
+        self.timeline = LyricTimeline()
+        # 当前歌词行号，第一句之前为-1
+        self.current_index = -1
 
     def parse_lrc(self, lrc_content: str) -> None:
         """解析LRC格式的歌词"""
-        self.lyrics.clear()
-        self.current_index = 0
-        
-        # 匹配时间标签和歌词文本
-        pattern = r'\[(\d{2}):(\d{2})\.(\d{2,3})\](.*)'
-        
-        for line in lrc_content.split('\n'):
-            match = re.match(pattern, line)
-            if match:
-                minutes, seconds, milliseconds, text = match.groups()
-                time = float(minutes) * 60 + float(seconds) + float(milliseconds) / 1000
-                if text.strip():  # 只添加非空歌词
-                    self.lyrics.append(LyricLine(time, text.strip()))
-        
-        # 按时间排序
-        self.lyrics.sort(key=lambda x: x.time)
-        _LOGGER.warning("解析到 %d 行歌词", len(self.lyrics))
+        self.load(parse_lrc(lrc_content))
+        _LOGGER.debug("解析到 %d 行歌词", len(self.timeline))
+
+    def load(self, timeline: LyricTimeline) -> None:
+        """使用已解析的歌词"""
+        self.timeline = timeline
+        self.current_index = -1
 
     def get_current_lyric(self, current_time: float) -> Optional[str]:
         """根据当前时间获取对应的歌词"""
-        if not self.lyrics:
+        times = self.timeline.times
+        count = len(times)
+        if count == 0:
             return None
-            
-        # 找到当前时间对应的歌词
-        for i, line in enumerate(self.lyrics):
-            if i == len(self.lyrics) - 1 or (line.time <= current_time < self.lyrics[i + 1].time):
-                self.current_index = i
-                return line.text
-                
-        return None
+
+        index = self.current_index
+        if (index >= 0 and times[index] > current_time) \
+                or (index + CURSOR_SCAN_LIMIT < count and times[index + CURSOR_SCAN_LIMIT] <= current_time):
+            # 后退或快进：二分查找
+            index = self.timeline.index_at(current_time)
+        else:
+            # 正常播放：从上次的位置向后移动
+            while index + 1 < count and times[index + 1] <= current_time:
+                index += 1
+
+        self.current_index = index
+        if index < 0:
+            return None
+        return self.timeline.texts[index]
+
+    def get_current_translation(self) -> Optional[str]:
+        """获取当前歌词的翻译"""
+        translations = self.timeline.translations
+        if translations is None or self.current_index < 0:
+            return None
+        return translations[self.current_index]
+
+    def get_current_romanization(self) -> Optional[str]:
+        """获取当前歌词的罗马音"""
+        romanizations = self.timeline.romanizations
+        if romanizations is None or self.current_index < 0:
+            return None
+        return romanizations[self.current_index]
 
     def get_next_lyric(self) -> Optional[str]:
         """获取下一句歌词"""
-        if not self.lyrics or self.current_index >= len(self.lyrics) - 1:
+        texts = self.timeline.texts
+        if self.current_index + 1 >= len(texts):
             return None
-        return self.lyrics[self.current_index + 1].text
+        return texts[self.current_index + 1]
 
     def get_previous_lyric(self) -> Optional[str]:
         """获取上一句歌词"""
-        if not self.lyrics or self.current_index <= 0:
+        if self.current_index <= 0:
             return None
-        return self.lyrics[self.current_index - 1].text
-
-    async def search_song(self, song_name: str, artist: str) -> Optional[str]:
-        """搜索歌曲获取ID"""
-        try:
-            search_url = "https://music.163.com/api/search/get/web"
-            params = {
-                's': f"{song_name} {artist}",
-                'type': 1,  # 1: 单曲, 10: 专辑, 100: 歌手, 1000: 歌单
-                'limit': 1
-            }
-            
-            _LOGGER.warning("搜索歌曲: %s - %s", song_name, artist)
-            async with aiohttp.ClientSession() as session:
-                async with session.get(search_url, params=params, headers=self.headers) as response:
-                    if response.status == 200:
-                        text = await response.text()
-                        try:
-                            data = json.loads(text)
-                            _LOGGER.warning("搜索响应: %s", data)
-                            if data.get('result', {}).get('songs'):
-                                song_id = str(data['result']['songs'][0]['id'])
-                                _LOGGER.warning("找到歌曲ID: %s", song_id)
-                                return song_id
-                            else:
-                                _LOGGER.warning("未找到歌曲，响应数据: %s", data)
-                        except json.JSONDecodeError as e:
-                            _LOGGER.error("解析JSON失败: %s, 响应内容: %s", e, text)
-        except Exception as e:
-            _LOGGER.error("搜索歌曲出错: %s", e)
-        return None
-
-    async def fetch_lyrics(self, song_name: str, artist: str) -> Optional[str]:
-        """从网易云音乐获取歌词"""
-        try:
-            # 1. 搜索歌曲获取ID
-            song_id = await self.search_song(song_name, artist)
-            if not song_id:
-                _LOGGER.warning("无法获取歌曲ID，跳过获取歌词")
-                return None
-
-            # 2. 获取歌词
-            lyrics_url = f"https://music.163.com/api/song/lyric?id={song_id}&lv=1&kv=1&tv=-1"
-            _LOGGER.warning("获取歌词URL: %s", lyrics_url)
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.get(lyrics_url, headers=self.headers) as response:
-                    if response.status == 200:
-                        text = await response.text()
-                        try:
-                            data = json.loads(text)
-                            _LOGGER.warning("歌词响应: %s", data)
-                            # 优先使用翻译歌词，如果没有则使用原文歌词
-                            lrc = data.get('lrc', {}).get('lyric', '')
-                            if not lrc:
-                                _LOGGER.warning("未找到歌词内容，完整响应: %s", data)
-                                return None
-                            _LOGGER.warning("获取到歌词，长度: %d", len(lrc))
-                            return lrc
-                        except json.JSONDecodeError as e:
-                            _LOGGER.error("解析JSON失败: %s, 响应内容: %s", e, text)
-                    else:
-                        _LOGGER.error("获取歌词失败，状态码: %d", response.status)
-        except Exception as e:
-            _LOGGER.error("获取歌词出错: %s", e)
-        return None 
\ No newline at end of file
+        return self.timeline.texts[self.current_index - 1]
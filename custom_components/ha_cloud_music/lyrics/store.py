@@ -0,0 +1,133 @@
+import json
+import asyncio
+import logging
+from typing import Optional
+
+from aiohttp import ClientError
+
+from ..http_api import http_request, read_text, CircuitOpenError
+from ..cache import TTLCache, PersistentCache
+from ..utils import SingleFlight
+from ..models.music_info import MusicSource, NETEASE_SOURCES
+from .parser import parse_lrc, parse_yrc
+
+_LOGGER = logging.getLogger(__name__)
+
+SEARCH_API = 'https://music.163.com/api/search/get/web'
+LYRIC_API = 'https://music.163.com/api/song/lyric'
+HEADERS = {
+    'Referer': 'https://music.163.com/',
+    'Origin': 'https://music.163.com'
+}
+
+# 内存中保留的歌词数量及字节数
+LYRIC_CACHE_SIZE = 200
+LYRIC_CACHE_BYTES = 5 * 1024 * 1024
+# 磁盘缓存上限（字节）
+LYRIC_DISK_CACHE_SIZE = 20 * 1024 * 1024
+
+# 保存的歌词字段：原文、翻译、罗马音、逐字歌词
+LYRIC_FIELDS = ['lrc', 'tlyric', 'romalrc', 'yrc']
+
+class Lyric():
+    ''' 原始歌词字段及解析后的时间轴 '''
+
+    def __init__(self, fields, key=None):
+        self.key = key
+        self.fields = fields
+        self.lrc = fields.get('lrc') or ''
+        # 有逐字歌词时优先使用，可以按字高亮
+        timeline = parse_yrc(fields.get('yrc'))
+        if len(timeline) == 0:
+            timeline = parse_lrc(self.lrc)
+        # 翻译和罗马音在加载时对齐，播放时按行号直接读取
+        timeline.translations = timeline.align(parse_lrc(fields.get('tlyric')))
+        timeline.romanizations = timeline.align(parse_lrc(fields.get('romalrc')))
+        self.timeline = timeline
+
+    def __bool__(self):
+        return len(self.timeline) > 0
+
+    @property
+    def size(self):
+        return sum(len(value or '') for value in self.fields.values())
+
+class LyricStore():
+    ''' 歌词缓存：网易云歌曲直接按ID获取，其他来源按歌名歌手搜索；没有歌词的结果也会缓存 '''
+
+    def __init__(self, hass, path, max_bytes=LYRIC_DISK_CACHE_SIZE):
+        self.memory = TTLCache(LYRIC_CACHE_SIZE, LYRIC_CACHE_BYTES)
+        self.disk = PersistentCache(hass, path, max_bytes)
+        self.single_flight = SingleFlight()
+
+    def lyric_key(self, music_info):
+        if music_info.source in NETEASE_SOURCES:
+            return f'id:{music_info.id}'
+        return f'search:{music_info.song}:{music_info.singer or ""}'
+
+    async def async_get(self, music_info) -> Optional[Lyric]:
+        key = self.lyric_key(music_info)
+        lyric = self.memory.get(key)
+        if lyric is not None:
+            return lyric
+        return await self.single_flight.run(key, self._async_load, key, music_info)
+
+    async def _async_load(self, key, music_info):
+        cached = await self.disk.async_get(key)
+        if cached is not None:
+            lyric = Lyric(cached[0], key)
+        else:
+            fields = await self._async_fetch(music_info)
+            # 网络错误不缓存，下次重新获取
+            if fields is None:
+                return None
+            lyric = Lyric(fields, key)
+            await self.disk.async_set(key, fields)
+        self.memory.set(key, lyric, size=lyric.size)
+        return lyric
+
+    async def _async_fetch(self, music_info):
+        try:
+            song_id = None
+            if music_info.source in NETEASE_SOURCES:
+                song_id = music_info.id
+            else:
+                song_id = await self.async_search_song(music_info.song, music_info.singer or '')
+                if song_id is None:
+                    return {}
+            fields = await self.async_lyric_fields(song_id)
+            # 云盘歌曲可能是未匹配的上传文件，再按歌名搜索一次
+            if not fields.get('lrc') and music_info.source == MusicSource.CLOUD.value and music_info.song:
+                song_id = await self.async_search_song(music_info.song, music_info.singer or '')
+                if song_id is not None:
+                    fields = await self.async_lyric_fields(song_id)
+            return fields
+        except (ClientError, asyncio.TimeoutError, CircuitOpenError) as ex:
+            _LOGGER.debug('获取歌词失败：%s %s', music_info.song, ex)
+        except Exception as ex:
+            _LOGGER.error('获取歌词出错：%s', ex)
+
+    async def async_search_song(self, song_name, artist):
+        ''' 搜索歌曲获取ID '''
+        params = {
+            's': f'{song_name} {artist}',
+            'type': 1,  # 1: 单曲, 10: 专辑, 100: 歌手, 1000: 歌单
+            'limit': 1
+        }
+        text = await http_request(SEARCH_API, reader=read_text, params=params, headers=HEADERS)
+        songs = json.loads(text).get('result', {}).get('songs')
+        if songs:
+            return str(songs[0]['id'])
+
+    async def async_lyric_fields(self, song_id):
+        ''' 获取歌词原文、翻译、罗马音和逐字歌词 '''
+        params = {'id': song_id, 'lv': -1, 'tv': -1, 'rv': -1, 'yv': -1, 'kv': -1}
+        text = await http_request(LYRIC_API, reader=read_text, params=params, headers=HEADERS)
+        data = json.loads(text)
+        return {field: (data.get(field) or {}).get('lyric') or '' for field in LYRIC_FIELDS}
+
+    def clear(self):
+        self.memory.clear()
+
+    async def async_close(self):
+        await self.disk.async_close()
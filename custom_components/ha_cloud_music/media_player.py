@@ -1,11 +1,12 @@
-import logging, time, datetime
+import logging, time
 import asyncio
 
 
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers.event import async_call_later, async_track_state_change_event
+import homeassistant.util.dt as dt_util
 from homeassistant.components.media_player import MediaPlayerEntity, MediaPlayerDeviceClass, MediaPlayerEntityFeature
 from homeassistant.components.media_player.const import (
     SUPPORT_TURN_OFF,
@@ -47,6 +48,9 @@ from homeassistant.const import (
 
 from .manifest import manifest
 from .lyrics.parser import LyricParser
+from .http import HttpView, PLAY_CACHE_TTL
+from .models.music_info import NETEASE_SOURCES
+from .utils import CommandQueue
 
 DOMAIN = manifest.domain
 
@@ -56,9 +60,26 @@ SUPPORT_FEATURES = SUPPORT_VOLUME_STEP | SUPPORT_VOLUME_MUTE | SUPPORT_VOLUME_SE
     SUPPORT_PLAY_MEDIA | SUPPORT_PLAY | SUPPORT_PAUSE | SUPPORT_PREVIOUS_TRACK | SUPPORT_NEXT_TRACK | \
     MediaPlayerEntityFeature.BROWSE_MEDIA | SUPPORT_SEEK | SUPPORT_CLEAR_PLAYLIST | SUPPORT_SHUFFLE_SET | SUPPORT_REPEAT_SET
 
-# 定时器时间
-TIME_BETWEEN_UPDATES = datetime.timedelta(seconds=1)
-UNSUB_INTERVAL = None
+# 播放时钟：距离结束多少秒时切歌（没有测量到播放器的启动耗时时使用），唤醒时间的误差
+TRACK_END_MARGIN = 1
+CLOCK_TOLERANCE = 0.1
+# 提前切歌的时间范围（秒），按播放器从发送播放到开始播放的耗时调整
+MIN_LEAD_TIME = 0.2
+MAX_LEAD_TIME = 3
+# 启动耗时的平滑系数，以及等待播放器开始播放的时间（秒）
+LATENCY_SMOOTHING = 0.3
+START_CONFIRM_TIMEOUT = 10
+# 与播放器上报的进度相差多少秒时重新校准
+RESYNC_THRESHOLD = 1.5
+# 播放器在结束前多少秒内变为空闲时视为播放完毕
+IDLE_END_WINDOW = 5
+# 继续播放后等待播放器确认的时间（秒）
+PLAY_CONFIRM_TIMEOUT = 2
+# 连续多少次直接继续播放失败后改用暂停/播放，改用后每隔多少次重新尝试直接继续播放
+PLAY_WORKAROUND_THRESHOLD = 3
+PLAY_DIRECT_RETRY = 20
+# 发送命令后多少秒内播放器的状态变化视为命令引起的（加载、缓冲等）
+SOURCE_SETTLE_TIME = 2
 
 async def async_setup_entry(
     hass: HomeAssistant,
@@ -70,20 +91,14 @@ async def async_setup_entry(
     for source_media_player in entry.options.get('media_player', []):
       entities.append(CloudMusicMediaPlayer(hass, source_media_player))
 
-    def media_player_interval(now):
-      for mp in entities:
-        mp.interval(now)
-
-    # 开启定时器
-    global UNSUB_INTERVAL
-    if UNSUB_INTERVAL is not None:
-      UNSUB_INTERVAL()
-    UNSUB_INTERVAL = async_track_time_interval(hass, media_player_interval, TIME_BETWEEN_UPDATES)
-
     async_add_entities(entities, True)
 
 class CloudMusicMediaPlayer(MediaPlayerEntity):
 
+    # 歌词属性只是写入状态时（播放、暂停、跳转、切歌）的歌词，之后不会随进度更新，不写入数据库
+    # 需要实时歌词请订阅 ha_cloud_music/lyrics/subscribe 或使用歌词卡片
+    _unrecorded_attributes = frozenset({'current_lyric', 'current_lyric_translation', 'next_lyric', 'lyrics_id'})
+
     def __init__(self, hass, source_media_player):
         self.hass = hass
         self._attributes = {
@@ -104,98 +119,244 @@ class CloudMusicMediaPlayer(MediaPlayerEntity):
         self._attr_shuffle = False
 
         self.cloud_music = hass.data['cloud_music']
-        self.before_state = None
-        self.current_state = None
-        self._last_seek_time = None
-        
+
+        # 播放时钟：播放或跳转时记录单调时钟和进度，只在歌词切换和歌曲结束时唤醒
+        self._attr_media_position = 0
+        self._attr_media_duration = 0
+        self._clock_anchor = None
+        self._unsub_clock = None
+        # 等待播放器状态：[(判断函数, future)]
+        self._state_waiters = []
+        # 测量播放器启动耗时的任务
+        self._start_task = None
+        self._start_future = None
+        # 切歌、播放暂停、跳转依次执行，连续操作只执行最后一次
+        self._commands = CommandQueue()
+        # 正在向播放器发送命令及最后一次命令完成的时间，期间的状态变化不做处理
+        self._commanding = 0
+        self._command_done_at = None
+        # 使用暂停/播放继续播放的次数
+        self._workaround_plays = 0
+
         # 歌词相关
         self.lyric_parser = LyricParser()
         self._attr_lyrics = None
         self._attr_current_lyric = None
-        self._last_lyric_update = None
-
-    def interval(self, now):
-        # _LOGGER.warning("播放状态：%s", self._attr_state)
-        
-        # 暂停时不更新
-        if self._attr_state != STATE_PLAYING:
+        self._lyric = None
+        self._lyrics_task = None
+        # 歌词卡片的订阅
+        self._lyrics_listeners = set()
+
+        # 预加载下一曲（播放列表、随机、循环变化时失效）
+        self.next_playindex = None
+        self._queue_version = 0
+        self._prefetch = None
+        self._prefetch_task = None
+
+    async def async_added_to_hass(self):
+        self.cloud_music.media_players[self.entity_id] = self
+        # 监听播放器状态，校准进度并判断播放结束
+        self.async_on_remove(async_track_state_change_event(
+            self.hass, [self.source_media_player], self._async_source_changed
+        ))
+
+    @callback
+    def _async_source_changed(self, event):
+        new_state = event.data.get('new_state')
+        if new_state is None:
             return
-    
-        # 获取当前时间
-        new_updated_at = datetime.datetime.now()
-        
-        # 如果是第一次调用或者需要重置计时
-        if not hasattr(self, '_last_position_update') or self._last_position_update is None:
-            self._last_position_update = new_updated_at
-            self._attr_media_position = 0
-        else:
-            self._attr_media_position += 1  # 增加整数秒
-            self._last_position_update = new_updated_at
-            self._attr_media_position_updated_at = datetime.datetime.now(datetime.timezone.utc)
-            
-            # 更新歌词
-            if self._attr_lyrics:
-                current_lyric = self.lyric_parser.get_current_lyric(self._attr_media_position)
-                if current_lyric != self._attr_current_lyric:
-                    _LOGGER.warning("更新歌词 - 位置: %d, 歌词: %s", self._attr_media_position, current_lyric)
-                    self._attr_current_lyric = current_lyric
-                    self._attributes['current_lyric'] = current_lyric
-                    
-                    # 获取下一句歌词
-                    next_lyric = self.lyric_parser.get_next_lyric()
-                    self._attributes['next_lyric'] = next_lyric
-                    
-                    self.hass.loop.call_soon_threadsafe(self.async_write_ha_state)
-            
-        self.hass.loop.call_soon_threadsafe(self.async_write_ha_state)
-        # 更新其他属性（从DLNA设备获取）
-        media_player = self.media_player
-        if media_player is not None:
-            attrs = media_player.attributes
-            self._attr_media_duration = attrs.get('media_duration', 0)
-
-            # 判断是否下一曲
-            if self.before_state is not None:
-                # 判断音乐总时长
-                if self.before_state['media_duration'] > 0:
-                    delta = self._attr_media_duration - self._attr_media_position
-                    # _LOGGER.warning("差值：%s", delta)
-                    if delta <= 1 and self._attr_media_duration > 1 and delta >= 0:
-                        _LOGGER.warning("小于1 切歌")
-                        self._attr_state = STATE_PAUSED
-                        self.before_state = None
-                        self.hass.loop.call_soon_threadsafe(
-                            lambda: asyncio.create_task(self.async_media_next_track())
-                        )
-                        return
-    
-                # if (self.before_state['media_duration'] == 0 and 
-                #     self.before_state['media_position'] == 0 and 
-                #     self.current_state == STATE_PLAYING and
-                #     self._attr_media_duration == 0 and 
-                #     self._attr_media_position == 0 and 
-                #     self._attr_state == STATE_PLAYING):
-                #     time.sleep(10)
-                #     if (self.before_state['media_duration'] == 0 and 
-                #         self.before_state['media_position'] == 0 and 
-                #         self.current_state == STATE_PLAYING and
-                #         self._attr_media_duration == 0 and 
-                #         self._attr_media_position == 0 and 
-                #         self._attr_state == STATE_PLAYING):
-                #         self.hass.loop.call_soon_threadsafe(
-                #             lambda: asyncio.create_task(self.async_media_next_track())
-                #         )
-                #         self.before_state = None
-                #         return
-    
-        # 更新状态记录
-        self.before_state = {
-            'media_position': int(self._attr_media_position),
-            'media_duration': int(self._attr_media_duration),
-            'state': self.current_state
+        old_state = event.data.get('old_state')
+        for predicate, future in list(self._state_waiters):
+            if not future.done() and predicate(new_state, old_state):
+                future.set_result(new_state)
+        attrs = new_state.attributes
+        changed = False
+
+        duration = attrs.get('media_duration') or 0
+        if duration > 0 and duration != self._attr_media_duration:
+            self._attr_media_duration = duration
+            changed = True
+
+        if self._source_settling:
+            if changed:
+                self._clock_tick()
+                self.async_write_ha_state()
+            return
+
+        if self._attr_state == STATE_PLAYING and self._clock_anchor is not None:
+            if new_state.state == STATE_PLAYING:
+                # 按播放器上报的进度校准
+                position = self._source_position(new_state)
+                if position is not None and abs(position - self.clock_position) > RESYNC_THRESHOLD:
+                    _LOGGER.debug('校准播放进度：%s -> %s', self.clock_position, position)
+                    self._clock_start(position)
+                    changed = True
+                elif changed:
+                    self._clock_tick()
+            elif new_state.state == STATE_PAUSED:
+                self._attr_state = STATE_PAUSED
+                self._clock_stop(self._source_position(new_state))
+                changed = True
+            elif old_state is not None and old_state.state == STATE_PLAYING \
+                    and new_state.state in (STATE_IDLE, STATE_OFF, STATE_ON):
+                duration = self._attr_media_duration
+                if duration > 0 and self.clock_position >= duration - IDLE_END_WINDOW:
+                    # 播放完毕
+                    _LOGGER.debug('播放器已空闲，切换下一曲')
+                    self._attr_state = STATE_PAUSED
+                    self._clock_stop(duration)
+                    self.hass.async_create_task(self.async_auto_next_track())
+                else:
+                    # 在播放器上停止
+                    self._attr_state = STATE_PAUSED
+                    self._clock_stop()
+                changed = True
+        elif self._attr_state == STATE_PAUSED and new_state.state == STATE_PLAYING \
+                and hasattr(self, 'playlist'):
+            # 在播放器上继续播放
+            self._attr_state = STATE_PLAYING
+            self._clock_start(self._source_position(new_state))
+            changed = True
+
+        if changed:
+            self.async_write_ha_state()
+
+    # 命令发出后播放器的状态还在变化
+    @property
+    def _source_settling(self):
+        return self._commanding > 0 or (self._command_done_at is not None
+            and time.monotonic() - self._command_done_at < SOURCE_SETTLE_TIME)
+
+    # 播放器上报的当前进度
+    def _source_position(self, state):
+        position = state.attributes.get('media_position')
+        if position is None:
+            return None
+        updated_at = state.attributes.get('media_position_updated_at')
+        if updated_at is not None and state.state == STATE_PLAYING:
+            position += (dt_util.utcnow() - updated_at).total_seconds()
+        return position
+
+    # 当前歌曲的完整歌词
+    @property
+    def lyrics_data(self):
+        lyric = self._lyric
+        data = {
+            'entity_id': self.entity_id,
+            'lyrics_id': None,
+            'media_title': self._attr_media_title,
+            'media_artist': self._attr_media_artist,
+            'lrc': None
         }
-        self.current_state = media_player.state if media_player is not None else self._attr_state
-    
+        if lyric is not None:
+            data.update(lyric.timeline.as_dict())
+            data['lyrics_id'] = lyric.key
+            data['lrc'] = lyric.lrc
+        return data
+
+    # 播放状态锚点，前端据此自行推算进度
+    @property
+    def lyrics_anchor(self):
+        return {
+            'type': 'anchor',
+            'lyrics_id': self._lyric.key if self._lyric is not None else None,
+            'state': self._attr_state,
+            'position': self._attr_media_position,
+            'updated_at': self._attr_media_position_updated_at.isoformat() if self._attr_media_position_updated_at else None,
+            'duration': self._attr_media_duration
+        }
+
+    # 完整歌词及当前锚点，每首歌只发送一次
+    @property
+    def lyrics_message(self):
+        return { **self.lyrics_data, 'type': 'lyrics', 'anchor': self.lyrics_anchor }
+
+    @callback
+    def async_subscribe_lyrics(self, listener):
+        ''' 订阅歌词和播放状态变化，返回取消订阅的函数 '''
+        self._lyrics_listeners.add(listener)
+
+        @callback
+        def unsubscribe():
+            self._lyrics_listeners.discard(listener)
+        return unsubscribe
+
+    def _notify_lyrics(self, message):
+        for listener in list(self._lyrics_listeners):
+            listener(message)
+
+    # 当前播放进度
+    @property
+    def clock_position(self):
+        if self._clock_anchor is None:
+            return self._attr_media_position
+        return self._attr_media_position + time.monotonic() - self._clock_anchor
+
+    # 从指定进度开始计时
+    def _clock_start(self, position=None):
+        if position is not None:
+            self._attr_media_position = position
+        self._clock_anchor = time.monotonic()
+        self._attr_media_position_updated_at = dt_util.utcnow()
+        self._update_media_info()
+        self._clock_tick()
+        self._notify_lyrics(self.lyrics_anchor)
+
+    # 暂停计时，保留当前进度
+    def _clock_stop(self, position=None):
+        self._attr_media_position = self.clock_position if position is None else position
+        self._attr_media_position_updated_at = dt_util.utcnow()
+        self._clock_anchor = None
+        self._cancel_clock()
+        self._notify_lyrics(self.lyrics_anchor)
+
+    def _cancel_clock(self):
+        if self._unsub_clock is not None:
+            self._unsub_clock()
+            self._unsub_clock = None
+
+    @callback
+    def _async_clock_wakeup(self, now):
+        self._unsub_clock = None
+        if self._clock_anchor is None:
+            return
+        self._clock_tick()
+        self.async_write_ha_state()
+
+    # 判断是否切歌，然后安排下一次唤醒
+    def _clock_tick(self):
+        self._cancel_clock()
+        if self._clock_anchor is None:
+            return
+        position = self.clock_position + CLOCK_TOLERANCE
+        duration = self._attr_media_duration
+        lead_time = self.end_lead_time
+        if duration > lead_time and position >= duration - lead_time:
+            _LOGGER.debug('播放即将结束，切换下一曲')
+            self._attr_state = STATE_PAUSED
+            self._clock_stop(duration)
+            self.hass.async_create_task(self.async_auto_next_track())
+            return
+
+        # 在歌曲结束前（按播放器启动耗时提前）唤醒，时长由播放器状态事件更新，歌词由前端按进度自行切换
+        if duration <= lead_time:
+            return
+        delay = max(duration - lead_time - position, CLOCK_TOLERANCE)
+        self._unsub_clock = async_call_later(self.hass, delay, self._async_clock_wakeup)
+
+    def _update_lyric(self, position):
+        if not self._attr_lyrics:
+            return
+        index = self.lyric_parser.current_index
+        current_lyric = self.lyric_parser.get_current_lyric(position)
+        if self.lyric_parser.current_index != index or current_lyric != self._attr_current_lyric:
+            self._attr_current_lyric = current_lyric
+            self._attributes['current_lyric'] = current_lyric
+            self._attributes['current_lyric_translation'] = self.lyric_parser.get_current_translation()
+            # 获取下一句歌词
+            self._attributes['next_lyric'] = self.lyric_parser.get_next_lyric()
+
+    def _update_media_info(self):
         if hasattr(self, 'playlist'):
             music_info = self.playlist[self.playindex]
             self._attr_app_name = music_info.singer
@@ -203,7 +364,6 @@ class CloudMusicMediaPlayer(MediaPlayerEntity):
             self._attr_media_album_name = music_info.album
             self._attr_media_title = music_info.song
             self._attr_media_artist = music_info.singer
-        # self.hass.loop.call_soon_threadsafe(lambda: asyncio.create_task(self.async_write_ha_state()))
 
     @property
     def media_player(self):
@@ -224,6 +384,8 @@ class CloudMusicMediaPlayer(MediaPlayerEntity):
 
     @property
     def extra_state_attributes(self):
+        # 写入状态时按当前进度更新歌词，不再为每句歌词单独写入状态（两次写入之间的歌词属性是旧的）
+        self._update_lyric(self.clock_position)
         return self._attributes
 
     async def async_browse_media(self, media_content_type=None, media_content_id=None):
@@ -244,99 +406,333 @@ class CloudMusicMediaPlayer(MediaPlayerEntity):
         await self.async_call('volume_set', { 'volume_level': volume })
 
     async def async_play_media(self, media_type, media_id, **kwargs):
+        await self._commands.run('play', self._async_play_media, media_type, media_id)
+
+    async def _async_play_media(self, media_type, media_id):
+        self._cancel_start_task()
         self._attr_state = STATE_PAUSED
-        self._attr_media_position = 0  # 重置进度
-        self._attr_media_position_updated_at = datetime.datetime.now(datetime.timezone.utc)
+        self._clock_stop(0)  # 重置进度
+        self._attr_media_duration = 0
+        self._reset_lyrics()
         
-        media_content_id = media_id
-        result = await self.cloud_music.async_play_media(self, self.cloud_music, media_id)
-        if result is not None:
-            if result == 'index':
-                # 播放当前列表指定项
-                media_content_id = self.playlist[self.playindex].url
-            elif result.startswith('http'):
-                # HTTP播放链接
-                media_content_id = result
-            else:
-                # 添加播放列表到播放器
-                media_content_id = self.playlist[self.playindex].url
+        # 切歌期间播放器的状态变化（旧歌曲仍在播放、加载新歌曲）不做处理
+        self._commanding += 1
+        try:
+            media_content_id = media_id
+            result = await self.cloud_music.async_play_media(self, self.cloud_music, media_id)
+            if result == 'playlist':
+                # 播放列表已替换
+                self._invalidate_prefetch()
+            self.next_playindex = None
+            prefetch = self._take_prefetch()
+            if result is not None:
+                if result == 'index':
+                    # 播放当前列表指定项
+                    media_content_id = self.playlist[self.playindex].url
+                elif result.startswith('http'):
+                    # HTTP播放链接
+                    media_content_id = result
+                else:
+                    # 添加播放列表到播放器
+                    media_content_id = self.playlist[self.playindex].url
+
+            # 播放的是列表中的歌曲时，直接使用预加载的播放链接，省去播放器请求跳转（外部传入的链接原样播放）
+            prefetched = prefetch is not None and prefetch.get('url') is not None \
+                and time.monotonic() - prefetch['resolved_at'] < PLAY_CACHE_TTL \
+                and hasattr(self, 'playlist') and media_content_id == self.playlist[self.playindex].url
+            play_url = prefetch['url'] if prefetched else media_content_id
+
+            self._attr_media_content_id = media_content_id
+
+            # 播放器开始播放新歌曲（从其他状态变为播放，或者播放链接已变化）
+            started = time.monotonic()
+            start_future = self._wait_source_state(lambda state, old_state:
+                state.state == STATE_PLAYING and (old_state is None or old_state.state != STATE_PLAYING
+                    or state.attributes.get('media_content_id') == play_url))
+            try:
+                await self.async_call('play_media', {
+                    'media_content_id': play_url,
+                    'media_content_type': 'music'
+                })
+            except BaseException:
+                start_future.cancel()
+                raise
+        finally:
+            self._commanding -= 1
+        # 开始播放后再批量获取后面几首歌的链接，切歌时直接命中缓存
+        if hasattr(self, 'playlist'):
+            self.hass.async_create_background_task(
+                self.cloud_music.async_prefetch_song_urls(self.playlist, self.playindex),
+                f'{self.entity_id} song urls'
+            )
+        self._start_future = start_future
+        self._start_task = self.hass.async_create_background_task(
+            self._async_measure_start(start_future, started, prefetched), f'{self.entity_id} start'
+        )
+        self._attr_state = STATE_PLAYING
+        self._clock_start(0)
 
-        self._attr_media_content_id = media_content_id
-        
-        # 获取并解析歌词
+        # 歌词在开始播放后加载，不影响播放速度
         if hasattr(self, 'playlist'):
             music_info = self.playlist[self.playindex]
-            _LOGGER.warning("正在获取歌词 - 歌曲: %s, 歌手: %s", music_info.song, music_info.singer)
-            lyrics = await self.lyric_parser.fetch_lyrics(music_info.song, music_info.singer)
-            if lyrics:
-                _LOGGER.warning("成功获取歌词，长度: %d", len(lyrics))
-                self.lyric_parser.parse_lrc(lyrics)
-                self._attr_lyrics = lyrics
-                self._attr_current_lyric = None
-                self._attributes['lyrics'] = lyrics
-                self._attributes['current_lyric'] = None
+            # 预加载时获取歌词失败（网络错误）则重新获取
+            if prefetch is not None and prefetch['lyrics'] is not None:
+                self._set_lyrics(prefetch['lyrics'])
             else:
-                _LOGGER.warning("未能获取到歌词")
-
-        await self.async_call('play_media', {
-            'media_content_id': media_content_id,
-            'media_content_type': 'music'
-        })
-        self._attr_state = STATE_PLAYING
+                self._lyrics_task = self.hass.async_create_background_task(
+                    self._async_load_lyrics(music_info), f'{self.entity_id} lyrics'
+                )
+        self._schedule_prefetch()
+
+    async def _async_load_lyrics(self, music_info):
+        lyric = await self.cloud_music.lyric_store.async_get(music_info)
+        self._lyrics_task = None
+        self._set_lyrics(lyric)
+        self.async_write_ha_state()
 
-        self.before_state = None
+    # 取消正在加载的歌词并清空上一首的歌词
+    def _reset_lyrics(self):
+        if self._lyrics_task is not None:
+            self._lyrics_task.cancel()
+            self._lyrics_task = None
+        self.lyric_parser.parse_lrc('')
+        self._attr_lyrics = None
+        self._attr_current_lyric = None
+        self._lyric = None
+        self._attributes['lyrics_id'] = None
+        self._attributes['current_lyric'] = None
+        self._attributes['current_lyric_translation'] = None
+        self._attributes['next_lyric'] = None
+        self._notify_lyrics(self.lyrics_message)
+
+    def _set_lyrics(self, lyric):
+        if lyric:
+            self.lyric_parser.load(lyric.timeline)
+            self._attr_lyrics = lyric.lrc
+            self._attr_current_lyric = None
+            self._lyric = lyric
+            # 完整歌词通过 /cloud_music/lyrics 获取，状态中只保留标识
+            self._attributes['lyrics_id'] = lyric.key
+            self._attributes['current_lyric'] = None
+            self._attributes['current_lyric_translation'] = None
+            self._notify_lyrics(self.lyrics_message)
+
+    # 播放下一曲的同时，预先获取再下一首的播放链接和歌词
+    def _schedule_prefetch(self):
+        if self._prefetch_task is not None:
+            self._prefetch_task.cancel()
+            self._prefetch_task = None
+        if hasattr(self, 'playlist'):
+            self._prefetch_task = self.hass.async_create_background_task(
+                self._async_prefetch(self._queue_version), f'{self.entity_id} prefetch'
+            )
+
+    async def _async_prefetch(self, version):
+        playlist = self.playlist
+        playindex = self.cloud_music.get_next_playindex(self, self._attr_shuffle, self._attr_repeat)
+        if playindex is None:
+            return
+        # 随机播放时记住选好的下一曲
+        if self._attr_shuffle:
+            self.next_playindex = playindex
+        music_info = playlist[playindex]
+        url = None
+        resolved_at = time.monotonic()
+        try:
+            # 写入播放链接缓存，切歌时直接交给播放器；没有找到链接时不保存，播放时仍通过代理地址重新获取
+            if music_info.source in NETEASE_SOURCES:
+                url = await HttpView().async_play_url(self.hass, music_info.id, music_info.song, music_info.singer or '',
+                    music_info.source, fallback=False)
+            lyrics = await self.cloud_music.lyric_store.async_get(music_info)
+        except Exception as ex:
+            _LOGGER.debug('预加载下一曲失败：%s', ex)
+            return
+        if version == self._queue_version and playlist is self.playlist:
+            self._prefetch = {
+                'version': version,
+                'playlist': playlist,
+                'index': playindex,
+                'url': url,
+                'resolved_at': resolved_at,
+                'lyrics': lyrics
+            }
+
+    # 取出当前歌曲的预加载结果
+    def _take_prefetch(self):
+        prefetch = self._prefetch
+        self._prefetch = None
+        if prefetch is not None and hasattr(self, 'playlist') \
+                and prefetch['version'] == self._queue_version \
+                and prefetch['playlist'] is self.playlist \
+                and prefetch['index'] == self.playindex:
+            return prefetch
+
+    def _invalidate_prefetch(self):
+        self._queue_version += 1
+        self._prefetch = None
+        self.next_playindex = None
+        if self._prefetch_task is not None:
+            self._prefetch_task.cancel()
+            self._prefetch_task = None
 
     async def async_media_play(self):
+        await self._commands.run('transport', self._async_media_play)
+
+    async def async_media_pause(self):
+        await self._commands.run('transport', self._async_media_pause)
+
+    async def _async_media_play(self):
+        source = self.source_media_player
+        renderer = self.cloud_music.get_renderer(source)
+        workaround = renderer.get('play_workaround', False)
+        state = None
+        # 已改用暂停/播放的播放器，隔一段时间重新尝试直接继续播放
+        direct = not workaround or self._workaround_plays >= PLAY_DIRECT_RETRY
+        if direct:
+            self._workaround_plays = 0
+            state = await self._async_call_confirmed('media_play', STATE_PLAYING)
+            if state is None:
+                _LOGGER.debug('%s 未能继续播放，改用暂停/播放', source)
+            else:
+                self.cloud_music.update_renderer(source, play_workaround=False, play_failures=0)
+        else:
+            self._workaround_plays += 1
+        if state is None:
+            state = await self._async_play_workaround()
+            # 暂停/播放有效时才计为直接继续播放失败，连续失败多次后才改用
+            if state is not None and direct:
+                failures = min(renderer.get('play_failures', 0) + 1, PLAY_WORKAROUND_THRESHOLD)
+                self.cloud_music.update_renderer(source, play_failures=failures,
+                    play_workaround=workaround or failures >= PLAY_WORKAROUND_THRESHOLD)
+        self._attr_state = STATE_PLAYING
+        self._clock_start(self._source_position(state) if state is not None else None)
+
+    # 部分播放器直接继续播放无效，需要先暂停再播放
+    async def _async_play_workaround(self):
         # 强制暂停一次
         await self.async_call('media_pause')
         await asyncio.sleep(0.1)
-         # 强制暂停一次
         await self.async_call('media_play')
         await asyncio.sleep(0.1)
-         # 强制暂停一次
+        # 强制暂停一次
         await self.async_call('media_pause')
         await asyncio.sleep(0.1)
-        
         # 然后再播放
-        await self.async_call('media_play')
-        self._attr_state = STATE_PLAYING
+        return await self._async_call_confirmed('media_play', STATE_PLAYING)
+
+    async def _async_call_confirmed(self, service, target, timeout=PLAY_CONFIRM_TIMEOUT):
+        ''' 发送命令并等待播放器进入目标状态，返回播放器状态，超时返回None '''
+        future = self._wait_source_state(lambda state, old_state: state.state == target)
+        try:
+            await self.async_call(service)
+            state = self.media_player
+            if state is not None and state.state == target:
+                return state
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            future.cancel()
+
+    def _wait_source_state(self, predicate):
+        ''' 播放器状态满足条件时完成的future，取消后不再等待 '''
+        future = self.hass.loop.create_future()
+        waiter = (predicate, future)
+        self._state_waiters.append(waiter)
+        future.add_done_callback(lambda f: self._state_waiters.remove(waiter))
+        return future
+
+    def _cancel_start_task(self):
+        if self._start_task is not None:
+            self._start_task.cancel()
+            self._start_task = None
+        if self._start_future is not None:
+            self._start_future.cancel()
+            self._start_future = None
+
+    # 从实际开始播放时计时，并测量从发送播放到播放器开始播放的耗时
+    # 只记录使用预加载链接的启动耗时，与自动切歌时的情况一致（首次播放还包含解析链接的时间）
+    async def _async_measure_start(self, future, started, sample):
+        try:
+            await asyncio.wait_for(future, START_CONFIRM_TIMEOUT)
+        except asyncio.TimeoutError:
+            return
+        latency = time.monotonic() - started
+        if self._attr_state == STATE_PLAYING:
+            self._clock_start(0)
+            self.async_write_ha_state()
+        if not sample:
+            return
+        source = self.source_media_player
+        average = self.cloud_music.get_renderer(source).get('start_latency')
+        if average is not None:
+            latency = average * (1 - LATENCY_SMOOTHING) + latency * LATENCY_SMOOTHING
+        self.cloud_music.update_renderer(source, start_latency=round(latency, 1))
 
-    async def async_media_pause(self):
+    # 提前切歌的时间，使下一首刚好在当前歌曲结束时开始播放
+    @property
+    def end_lead_time(self):
+        latency = self.cloud_music.get_renderer(self.source_media_player).get('start_latency')
+        if latency is None:
+            return TRACK_END_MARGIN
+        return min(max(latency, MIN_LEAD_TIME), MAX_LEAD_TIME)
+
+    async def _async_media_pause(self):
         self._attr_state = STATE_PAUSED
+        self._clock_stop()
         await self.async_call('media_pause')
 
     async def async_set_repeat(self, repeat):
         self._attr_repeat = repeat
+        self._invalidate_prefetch()
+        self._schedule_prefetch()
 
     async def async_set_shuffle(self, shuffle):
         self._attr_shuffle = shuffle
+        self._invalidate_prefetch()
+        self._schedule_prefetch()
 
     async def async_media_next_track(self):
         self._attr_state = STATE_PAUSED
         await self.cloud_music.async_media_next_track(self, self._attr_shuffle)
-        self._attr_media_position = 0
-        self._attr_media_position_updated_at = datetime.datetime.now()
+
+    # 播放结束后自动切换（按循环模式）
+    async def async_auto_next_track(self):
+        self._attr_state = STATE_PAUSED
+        await self.cloud_music.async_media_next_track(self, self._attr_shuffle, self._attr_repeat)
+        self.async_write_ha_state()
+
+    async def async_will_remove_from_hass(self):
+        self.cloud_music.media_players.pop(self.entity_id, None)
+        self._cancel_start_task()
+        self._cancel_clock()
+        self._invalidate_prefetch()
+        self._reset_lyrics()
+        # 结束歌词订阅，前端在实体重新添加后重新订阅
+        self._notify_lyrics({'type': 'end'})
+        self._lyrics_listeners.clear()
 
     async def async_media_previous_track(self):
         self._attr_state = STATE_PAUSED
         await self.cloud_music.async_media_previous_track(self, self._attr_shuffle)
-        self._attr_media_position = 0
-        self._attr_media_position_updated_at = datetime.datetime.now()
 
     async def async_media_seek(self, position):
+        await self._commands.run('seek', self._async_media_seek, position)
+
+    async def _async_media_seek(self, position):
         await self.async_call('media_seek', { 'seek_position': position })
-        # 更新进度状态
-        self._attr_media_position = position
-        self._attr_media_position_updated_at = datetime.datetime.now()
-        self._last_seek_time = datetime.datetime.now()
-        # 通知前端更新 UI
-        self.async_write_ha_state()
-        # 立即执行一次 interval，防止延迟或卡住不切歌
+        # 跳转后播放器会继续播放，从新的进度开始计时
         self._attr_state = STATE_PLAYING
-        self.interval(datetime.datetime.now())
-        
+        self._clock_start(position)
+        self.async_write_ha_state()
 
     async def async_media_stop(self):
+        await self._commands.run('transport', self._async_media_stop)
+
+    async def _async_media_stop(self):
+        # 与在播放器上停止一致，停在当前进度
+        self._attr_state = STATE_PAUSED
+        self._clock_stop()
         await self.async_call('media_stop')
 
     # 更新属性
@@ -347,5 +743,11 @@ class CloudMusicMediaPlayer(MediaPlayerEntity):
     async def async_call(self, service, service_data={}):
         media_player = self.media_player
         if media_player is not None:
-            service_data.update({ 'entity_id': media_player.entity_id })
-            await self.hass.services.async_call('media_player', service, service_data)
\ No newline at end of file
+            service_data = { **service_data, 'entity_id': media_player.entity_id }
+            self._commanding += 1
+            try:
+                # 等待播放器处理完成，之后的状态变化才是播放器自身的
+                await self.hass.services.async_call('media_player', service, service_data, blocking=True)
+            finally:
+                self._commanding -= 1
+                self._command_done_at = time.monotonic()
\ No newline at end of file
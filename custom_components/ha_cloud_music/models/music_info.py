@@ -9,6 +9,14 @@ class MusicSource(enum.Enum):
     ARTISTS = 5
     CLOUD = 6
 
+# 使用网易云音乐歌曲ID的音乐来源
+NETEASE_SOURCES = [
+    MusicSource.PLAYLIST.value,
+    MusicSource.ARTISTS.value,
+    MusicSource.DJRADIO.value,
+    MusicSource.CLOUD.value
+]
+
 class MusicInfo:
 
     def __init__(self, id, song, singer, album, duration, url, picUrl, source) -> None:
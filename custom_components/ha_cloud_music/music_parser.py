@@ -1,44 +1,131 @@
-from bs4 import BeautifulSoup
-import requests
-import re
+import re, json, codecs, asyncio, logging
+from html.parser import HTMLParser
 from .models.music_info import MusicInfo, MusicSource
+from aiohttp import ClientError
+from .http_api import http_request, read_text, CircuitOpenError
 
-def get_music(keyword):
-    # https://www.gequbao.com
-    api = 'https://www.fangpi.net'
-    session = requests.Session()
-    try:
-        response = session.get(f'{api}/s/{keyword}')
-        soup = BeautifulSoup(response.text.encode(response.encoding), 'lxml')
-        items = soup.select('.card-text .row')
-        if len(items) > 1:
-            row = items[1]
-            song = row.select('.music-title')[0].get_text().strip()
-            singer = row.select('.text-jade')[0].get_text().strip()
-
-            a = row.select('.music-link')
-            href = a[0].attrs['href']
-
-            response = session.get(f'{api}{href}')
-            html = response.text
-
-            soup = BeautifulSoup(html, 'lxml')
-            cover = soup.select('head meta[property="og:image"]')
-            pic = 'https://p2.music.126.net/tGHU62DTszbFQ37W9qPHcg==/2002210674180197.jpg'
+_LOGGER = logging.getLogger(__name__)
+
+# https://www.gequbao.com
+API = 'https://www.fangpi.net'
+DEFAULT_PIC = 'https://p2.music.126.net/tGHU62DTszbFQ37W9qPHcg==/2002210674180197.jpg'
+
+# 同时进行的搜索数量
+MUSIC_SOURCE_CONCURRENCY = 2
+_SEMAPHORE = asyncio.Semaphore(MUSIC_SOURCE_CONCURRENCY)
+
+CHUNK_SIZE = 8192
+PLAY_ID_PATTERN = re.compile(r"window.play_id = '(.*?)';")
+OG_IMAGE_PATTERN = re.compile(r'<meta\s[^>]*property="og:image"[^>]*>')
+CONTENT_PATTERN = re.compile(r'content="([^"]*)"')
+
+# 没有结束标签的元素
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'param', 'source', 'track', 'wbr'}
+
+class SearchResultParser(HTMLParser):
+    ''' 流式解析搜索结果，取 .card-text 下第二个 .row（第一个是表头）中的歌名、歌手和链接 '''
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        # 打开的元素：(标签, 作用)
+        self.stack = []
+        self.rows = 0
+        self.song = ''
+        self.singer = ''
+        self.href = None
+        self.done = False
+
+    def _in(self, role):
+        return any(item[1] == role for item in self.stack)
+
+    def handle_starttag(self, tag, attrs):
+        if self.done or tag in VOID_TAGS:
+            return
+        attrs = dict(attrs)
+        classes = (attrs.get('class') or '').split()
+        role = None
+        if 'card-text' in classes:
+            role = 'card'
+        elif 'row' in classes and self._in('card'):
+            self.rows += 1
+            if self.rows == 2:
+                role = 'row'
+        if self._in('row') or role == 'row':
+            if 'music-link' in classes and self.href is None:
+                self.href = attrs.get('href')
+            if 'music-title' in classes and not self.song:
+                role = 'title'
+            elif 'text-jade' in classes and not self.singer:
+                role = 'singer'
+        self.stack.append((tag, role))
+
+    def handle_endtag(self, tag):
+        if self.done or tag in VOID_TAGS:
+            return
+        while len(self.stack) > 0:
+            name, role = self.stack.pop()
+            if role == 'row':
+                self.done = True
+            if name == tag:
+                break
+
+    def handle_data(self, data):
+        if self.done:
+            return
+        if self._in('title'):
+            self.song += data
+        elif self._in('singer'):
+            self.singer += data
+
+async def read_search_result(resp):
+    ''' 分块读取，解析到结果后不再读取剩余内容 '''
+    parser = SearchResultParser()
+    decoder = codecs.getincrementaldecoder(resp.charset or 'utf-8')(errors='replace')
+    async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+        parser.feed(decoder.decode(chunk))
+        if parser.done:
+            break
+    if parser.href is not None:
+        return parser.song.strip(), parser.singer.strip(), parser.href
+
+async def read_play_page(resp):
+    ''' 分块读取详情页，找到播放ID后不再读取剩余内容 '''
+    decoder = codecs.getincrementaldecoder(resp.charset or 'utf-8')(errors='replace')
+    html = ''
+    async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+        html += decoder.decode(chunk)
+        match = PLAY_ID_PATTERN.search(html)
+        if match:
+            pic = DEFAULT_PIC
             # 封面
-            if len(cover) > 0:
-                pic = cover[0].attrs['content']
+            cover = OG_IMAGE_PATTERN.search(html)
+            if cover:
+                content = CONTENT_PATTERN.search(cover.group(0))
+                if content:
+                    pic = content.group(1)
+            return match.group(1), pic
 
-            album = ''
+async def async_get_music(keyword):
+    async with _SEMAPHORE:
+        try:
+            result = await http_request(f'{API}/s/{keyword}', reader=read_search_result)
+            if result is None:
+                return None
+            song, singer, href = result
+
+            result = await http_request(f'{API}{href}', reader=read_play_page)
+            if result is None:
+                return None
             # 音乐链接
-            pattern = r"window.play_id = '(.*?)';"
-            match = re.search(pattern, html)
-            if match:
-                songId = match.group(1)
-                response = session.post(f'{api}/api/play-url', data={'id': songId})
-                data = response.json()
-                if data.get('code') == 1:
-                    audio_url = data['data']['url']
-                    return MusicInfo(songId, song, singer, album, 0, audio_url, pic, MusicSource.URL.value)
-    except Exception as ex:
-        print(ex)
\ No newline at end of file
+            songId, pic = result
+            album = ''
+            text = await http_request(f'{API}/api/play-url', method='POST', reader=read_text, data={'id': songId})
+            data = json.loads(text)
+            if data.get('code') == 1:
+                audio_url = data['data']['url']
+                return MusicInfo(songId, song, singer, album, 0, audio_url, pic, MusicSource.URL.value)
+        except (ClientError, asyncio.TimeoutError, CircuitOpenError):
+            # 网络错误交给调用方处理
+            raise
+        except Exception as ex:
+            _LOGGER.debug('第三方音乐搜索失败：%s %s', keyword, ex)
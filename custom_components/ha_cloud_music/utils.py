@@ -1,8 +1,103 @@
+import asyncio, logging
 from urllib.parse import parse_qsl, quote
 
+_LOGGER = logging.getLogger(__name__)
+
 def parse_query(url_query):
     query = parse_qsl(url_query)
     data = {}
     for item in query:
         data[item[0]] = item[1]
-    return data
\ No newline at end of file
+    return data
+
+class SingleFlight():
+    ''' 合并相同KEY的并发调用，所有调用方共享同一次请求的结果 '''
+
+    def __init__(self):
+        self._calls = {}
+
+    def __contains__(self, key):
+        return key in self._calls
+
+    async def run(self, key, func, *args):
+        fut = self._calls.get(key)
+        if fut is None:
+            fut = asyncio.ensure_future(func(*args))
+            self._calls[key] = fut
+            fut.add_done_callback(lambda f: self._done(key, f))
+        # 单个调用方被取消时，不影响其他等待同一结果的调用方
+        return await asyncio.shield(fut)
+
+    def _done(self, key, fut):
+        if self._calls.get(key) is fut:
+            del self._calls[key]
+        # 所有调用方都已取消时，避免出现未获取异常的警告
+        if not fut.cancelled():
+            fut.exception()
+
+async def async_hedge(calls, delay, errors=None):
+    ''' 按顺序启动候选调用，前一个在delay秒内没有结果（或已失败）就启动下一个
+    calls为 [(名称, 无参协程函数)]，返回第一个有效结果 (名称, 结果)，并取消其余调用
+    调用抛出的异常会记录日志并加入errors '''
+    names = {}
+    pending = set()
+    index = 0
+    try:
+        while True:
+            if index < len(calls):
+                name, func = calls[index]
+                task = asyncio.ensure_future(func())
+                names[task] = name
+                pending.add(task)
+                index += 1
+            if len(pending) == 0:
+                return None, None
+            timeout = delay if index < len(calls) else None
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.cancelled():
+                    continue
+                ex = task.exception()
+                if ex is not None:
+                    _LOGGER.error('%s 出错：%r', names[task], ex, exc_info=ex)
+                    if errors is not None:
+                        errors.append(ex)
+                    continue
+                result = task.result()
+                if result:
+                    return names[task], result
+    finally:
+        for task in pending:
+            task.cancel()
+
+class CommandQueue():
+    ''' 按顺序执行命令；同类命令连续调用时只执行最后一次，并取消正在执行的旧命令 '''
+
+    def __init__(self):
+        self._lock = asyncio.Lock()
+        # 每类命令最后一次调用的序号
+        self._latest = {}
+        # 正在执行的命令：(类型, 任务)
+        self._running = None
+
+    async def run(self, kind, func, *args):
+        ''' 被新命令取代时返回None '''
+        generation = self._latest.get(kind, 0) + 1
+        self._latest[kind] = generation
+        running = self._running
+        if running is not None and running[0] == kind:
+            running[1].cancel()
+        async with self._lock:
+            if self._latest[kind] != generation:
+                return None
+            task = asyncio.ensure_future(func(*args))
+            self._running = (kind, task)
+            try:
+                return await task
+            except asyncio.CancelledError:
+                # 调用方自身被取消时继续抛出
+                if task.cancelled() and not asyncio.current_task().cancelling():
+                    return None
+                raise
+            finally:
+                self._running = None
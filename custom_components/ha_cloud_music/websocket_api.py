@@ -0,0 +1,28 @@
+import voluptuous as vol
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.components import websocket_api
+
+@callback
+def async_setup(hass: HomeAssistant):
+    websocket_api.async_register_command(hass, websocket_subscribe_lyrics)
+
+@websocket_api.websocket_command({
+    vol.Required('type'): 'ha_cloud_music/lyrics/subscribe',
+    vol.Required('entity_id'): str
+})
+@callback
+def websocket_subscribe_lyrics(hass, connection, msg):
+    ''' 订阅歌词：每首歌发送一次完整歌词，之后只发送播放、暂停、跳转的进度锚点 '''
+    cloud_music = hass.data.get('cloud_music')
+    media_player = cloud_music.media_players.get(msg['entity_id']) if cloud_music is not None else None
+    if media_player is None:
+        connection.send_error(msg['id'], websocket_api.ERR_NOT_FOUND, '媒体播放器不存在')
+        return
+
+    @callback
+    def forward(message):
+        connection.send_message(websocket_api.event_message(msg['id'], message))
+
+    connection.subscriptions[msg['id']] = media_player.async_subscribe_lyrics(forward)
+    connection.send_result(msg['id'])
+    forward(media_player.lyrics_message)